@@ -4,19 +4,15 @@ Debug script to test email processing independently
 """
 
 import os
-import sys
 import logging
 from datetime import datetime
 
-# Add paths for imports
-sys.path.append(os.path.join(os.path.dirname(__file__), 'engines'))
-sys.path.append(os.path.join(os.path.dirname(__file__), 'invoice_reader'))
-
+# The processor module adds the engines/ and invoice_reader/ import paths itself
 from integrated_email_invoice_processor import IntegratedEmailInvoiceProcessor
 
-# Configure logging to see detailed output
+# Configure logging - set DEBUG_EMAIL=1 to see detailed debug output
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.DEBUG if os.environ.get("DEBUG_EMAIL") else logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
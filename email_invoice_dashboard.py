@@ -15,16 +15,37 @@ This is the main web interface that allows users to:
 import streamlit as st  # Web framework for creating the dashboard
 import pandas as pd     # Data manipulation for displaying results in tables
 import json            # For handling JSON data structures
-import time            # For timing operations and delays
+import csv             # For writing small invoice tables without pandas
+import io              # In-memory buffer for CSV output
+import re              # For minifying the static CSS
+import time            # For cache entry ages
 import threading       # For background processes (if needed)
+import traceback       # For detailed error logs from background email checks
+import pickle          # For serializing cached invoice tables
+import hashlib         # For stable content hashes of invoice tables
+import zlib            # For compressing older cached invoice tables
+from collections import OrderedDict, deque  # LRU email cache and bounded log buffer
+from itertools import islice         # For taking the first N items of an iterator
+from concurrent.futures import ThreadPoolExecutor  # Runs email checks off the script thread
 from datetime import datetime  # For timestamp handling
 import sys             # For system path management
 import os              # For file system operations
+from streamlit_autorefresh import st_autorefresh  # Browser-driven periodic reruns
 
 # Add current directory to Python path so we can import our custom modules
-sys.path.append(os.path.dirname(__file__))
+# (guarded because Streamlit re-executes this file on every rerun)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
 from integrated_email_invoice_processor import IntegratedEmailInvoiceProcessor
 
+# Invoice tables smaller than this are rendered and exported without pandas
+SMALL_INVOICE_ROWS = 100
+
+# Shared worker pool for IMAP fetch + OCR + Drive upload cycles so a Streamlit
+# rerun never blocks on network I/O
+_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
 # Configure Streamlit page settings - must be called first
 st.set_page_config(
     page_title="Email-to-Invoice Processor",  # Browser tab title
@@ -33,7 +54,7 @@ st.set_page_config(
 )
 
 # Custom CSS styling to make the interface look professional
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     /* Main header styling */
     .main-header { 
@@ -81,7 +102,176 @@ st.markdown("""
         text-align: center; 
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+# Strip comments and whitespace once so every rerun sends the smallest payload
+CUSTOM_CSS = re.sub(r"\s+", " ", re.sub(r"/\*.*?\*/", "", CUSTOM_CSS)).strip()
+
+# Static instructions shown before any email has been processed
+HOW_IT_WORKS_MD = """
+## 🎯 How it works:
+
+1. **📧 Connect** to your Gmail account using app password
+2. **🔍 Check emails** for insurance-related messages with PDF attachments
+3. **📄 Extract data** from PDF invoices using OCR and AI
+4. **📊 Display results** in a structured table format
+5. **☁️ Upload to Google Drive** with CSV, metadata, and original files
+6. **🔗 Get shareable link** to the Google Drive folder
+
+### 📋 What gets uploaded to Google Drive:
+- **📊 CSV file** with extracted invoice data
+- **📝 JSON metadata** with email details
+- **📎 Original PDF/image** attachments
+"""
+
+class DashboardEmailCache:
+    """
+    Bounded LRU/TTL store for processed email results kept in session state.
+    
+    Session state lives in the Streamlit server process for every connected user,
+    so the processed email list is capped instead of growing with every check.
+    The invoice tables of all but the newest entries are kept zlib-compressed;
+    iteration yields them as stored and invoice_rows() decompresses a table
+    only when it is actually displayed.
+    """
+    
+    def __init__(self, max_size=200, ttl_seconds=3600, compress_after=20):
+        """
+        Args:
+            max_size (int): Maximum number of results kept; least recently used are evicted
+            ttl_seconds (int): Time since last use after which a result is dropped
+            compress_after (int): Number of newest results kept uncompressed
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.compress_after = compress_after
+        # key -> (stored_at timestamp, result dict)
+        self._entries = OrderedDict()
+    
+    def set(self, key, result, compress=False):
+        """
+        Insert or refresh a result, evicting the least recently used entries.
+        
+        Args:
+            key (str): Unique key for the email (Message-ID or processing time)
+            result (dict): Email processing result
+            compress (bool): Compress the invoice data of this entry right away
+        """
+        if compress:
+            result = self._compress(result)
+        self._entries[key] = (time.time(), result)
+        self._entries.move_to_end(key)
+        
+        # Evict least recently used entries once over capacity
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        
+        # Compress the entry that just dropped out of the "newest" window
+        aged_key = next(islice(reversed(self._entries), self.compress_after, None), None)
+        if aged_key is not None:
+            stored_at, aged_result = self._entries[aged_key]
+            self._entries[aged_key] = (stored_at, self._compress(aged_result))
+    
+    def get(self, key):
+        """
+        Return a cached result (decompressed) and mark it as recently used.
+        
+        Using an entry refreshes its timestamp as well as its position, so
+        entries stay ordered by timestamp and expiry can stop at the first live one.
+        
+        Args:
+            key (str): Key the result was stored under
+            
+        Returns:
+            dict or None: The result, or None if missing or expired
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._is_expired(entry):
+            del self._entries[key]
+            return None
+        self._entries[key] = (time.time(), entry[1])
+        self._entries.move_to_end(key)
+        return self._decompress(entry[1])
+    
+    def clear(self):
+        """Remove all cached results."""
+        self._entries.clear()
+    
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and not self._is_expired(entry)
+    
+    def __len__(self):
+        self._evict_expired()
+        return len(self._entries)
+    
+    def __iter__(self):
+        """Iterate stored results oldest first without changing their LRU order or decompressing them."""
+        self._evict_expired()
+        for _, result in list(self._entries.values()):
+            yield result
+    
+    def __reversed__(self):
+        """Iterate stored results newest first without changing their LRU order or decompressing them."""
+        self._evict_expired()
+        for _, result in reversed(list(self._entries.values())):
+            yield result
+    
+    @staticmethod
+    def invoice_rows(result):
+        """Return the invoice rows of a stored result, decompressing them if needed."""
+        if result.get('_invoice_data_compressed'):
+            return pickle.loads(zlib.decompress(result['invoice_data']))
+        return result.get('invoice_data') or []
+    
+    @staticmethod
+    def invoice_row_count(result):
+        """Return the number of invoice rows of a stored result without decompressing it."""
+        if result.get('_invoice_data_compressed'):
+            return result['_invoice_row_count']
+        return len(result.get('invoice_data') or [])
+    
+    def _is_expired(self, entry):
+        return self.ttl_seconds is not None and time.time() - entry[0] > self.ttl_seconds
+    
+    def _evict_expired(self):
+        # Entries are ordered by last use, so expired ones sit at the front
+        while self._entries and self._is_expired(next(iter(self._entries.values()))):
+            self._entries.popitem(last=False)
+    
+    @staticmethod
+    def _compress(result):
+        if result.get('_invoice_data_compressed'):
+            return result
+        compressed = dict(result)
+        invoice_data = result.get('invoice_data') or []
+        compressed['invoice_data'] = zlib.compress(pickle.dumps(invoice_data))
+        compressed['_invoice_row_count'] = len(invoice_data)
+        compressed['_invoice_data_compressed'] = True
+        return compressed
+    
+    @staticmethod
+    def _decompress(result):
+        if not result.get('_invoice_data_compressed'):
+            return result
+        decompressed = dict(result)
+        decompressed['invoice_data'] = pickle.loads(zlib.decompress(result['invoice_data']))
+        del decompressed['_invoice_data_compressed']
+        del decompressed['_invoice_row_count']
+        return decompressed
+
+def email_cache_key(result):
+    """
+    Build the cache key for a processed email result.
+    
+    Args:
+        result (dict): Email processing result
+        
+    Returns:
+        str: The email's Message-ID, or its processing time if it has none
+    """
+    return result.get('email_metadata', {}).get('message_id') or result.get('processed_at')
 
 def init_session_state():
     """
@@ -96,17 +286,23 @@ def init_session_state():
     if 'processing_active' not in st.session_state:
         st.session_state.processing_active = False
     
-    # List to store all processed email results for display
+    # Bounded cache of all processed email results for display
     if 'processed_emails' not in st.session_state:
-        st.session_state.processed_emails = []
+        st.session_state.processed_emails = DashboardEmailCache()
     
     # Timestamp of last email check for status display
     if 'last_check' not in st.session_state:
         st.session_state.last_check = None
     
-    # List to store processing logs for user feedback
+    # Bounded buffer of the most recent 50 processing logs for user feedback
     if 'processing_logs' not in st.session_state:
-        st.session_state.processing_logs = []
+        st.session_state.processing_logs = deque(maxlen=50)
+    
+    # Pending background email check (concurrent.futures.Future) and its mode
+    if 'email_check_future' not in st.session_state:
+        st.session_state.email_check_future = None
+    if 'email_check_force' not in st.session_state:
+        st.session_state.email_check_force = False
 
 def add_log(message):
     """
@@ -119,17 +315,34 @@ def add_log(message):
     timestamp = datetime.now().strftime("%H:%M:%S")
     log_entry = f"[{timestamp}] {message}"
     
-    # Add to logs list
+    # Add to logs buffer (the deque drops the oldest entry once full)
     st.session_state.processing_logs.append(log_entry)
+
+@st.cache_resource(show_spinner=False)
+def get_processor(email, password):
+    """
+    Create and connect an email processor, shared across reruns and browser tabs.
     
-    # Keep only the most recent 50 logs to prevent memory issues
-    if len(st.session_state.processing_logs) > 50:
-        st.session_state.processing_logs = st.session_state.processing_logs[-50:]
+    Args:
+        email (str): Gmail address
+        password (str): Gmail app password (not regular password)
+        
+    Returns:
+        IntegratedEmailInvoiceProcessor: Connected processor
+    """
+    # Create processor instance with credentials
+    processor = IntegratedEmailInvoiceProcessor(email, password)
+    # Attempt to connect to Gmail IMAP server
+    processor.connect()
+    return processor
 
 def create_processor(email, password):
     """
     Create and connect the email processor instance.
     
+    Reuses the cached connected processor when its IMAP connection is still
+    alive, so reconnecting skips the TLS handshake and IMAP login.
+    
     Args:
         email (str): Gmail address
         password (str): Gmail app password (not regular password)
@@ -138,43 +351,112 @@ def create_processor(email, password):
         IntegratedEmailInvoiceProcessor or None: Connected processor or None if failed
     """
     try:
-        # Create processor instance with credentials
-        processor = IntegratedEmailInvoiceProcessor(email, password)
-        # Attempt to connect to Gmail IMAP server
-        processor.connect()
+        processor = get_processor(email, password)
+        # The processor is shared by every session; a running check holds its lock and
+        # is using the connection, so only probe when it's free and never block the rerun
+        if processor.lock.acquire(blocking=False):
+            try:
+                # Cheap liveness check of the cached connection
+                processor.email_listener.imap.noop()
+                alive = True
+            except Exception:
+                alive = False
+            finally:
+                processor.lock.release()
+            if not alive:
+                # Connection dropped - rebuild the cached processor
+                get_processor.clear()
+                processor = get_processor(email, password)
         return processor
     except Exception as e:
         # Display error message to user if connection fails
         st.error(f"Failed to connect: {str(e)}")
         return None
 
-def check_emails_once(processor):
+def check_emails_once(processor, force_reprocess=False):
     """
-    Check for emails once and return results.
+    Start an email check in the background worker pool.
+    
+    The result is picked up by collect_email_check_results() on a later rerun,
+    so the Streamlit script thread is free while IMAP/OCR/Drive work runs.
     
     Args:
         processor: The email processor instance
-        
+        force_reprocess (bool): Check all emails from the last 3 days, not just unread
+    """
+    st.session_state.email_check_force = force_reprocess
+    st.session_state.email_check_future = _EXECUTOR.submit(
+        processor.check_and_process_emails, force_reprocess, batch_size=50
+    )
+    st.session_state.processing_active = True
+
+def collect_email_check_results():
+    """
+    Collect the results of a finished background email check, if any.
+    
     Returns:
-        list: List of processed email results
+        bool: True while an email check is still running, False otherwise
     """
+    future = st.session_state.email_check_future
+    if future is None:
+        return False
+    if not future.done():
+        return True
+    
+    # The check has finished - clear it before handling results
+    st.session_state.email_check_future = None
+    st.session_state.processing_active = False
+    st.session_state.last_check = datetime.now()
+    force_reprocess = st.session_state.email_check_force
+    
     try:
-        # Use the processor to check and process emails
-        results = processor.check_and_process_emails()
-        # Update last check timestamp
-        st.session_state.last_check = datetime.now()
-        return results
+        results = future.result()
     except Exception as e:
-        # Display error if email checking fails
-        st.error(f"Error checking emails: {str(e)}")
-        return []
+        add_log(f"❌ Error: {str(e)}")
+        add_log(f"Error details: {''.join(traceback.format_exception(e))}")
+        return False
+    
+    # Display processing status
+    if results:
+        if force_reprocess:
+            add_log(f"✅ Found {len(results)} insurance emails from last 3 days")
+        else:
+            add_log(f"✅ Found {len(results)} new insurance emails")
+        for result in results:
+            # Skip emails already on the dashboard (e.g. after a forced re-check)
+            key = email_cache_key(result)
+            if key in st.session_state.processed_emails:
+                continue
+            result['_display'] = build_display_fields(result)
+            st.session_state.processed_emails.set(key, result)
+        
+        # Show what was processed in logs only
+        for result in results:
+            email_meta = result.get('email_metadata', {})
+            subject = email_meta.get('subject', 'Unknown Subject')
+            add_log(f"📧 Processed: {subject}")
+            if result.get('drive_link'):
+                add_log(f"☁️ Uploaded to Google Drive: {subject}")
+            else:
+                add_log(f"💾 Saved locally (Google Drive failed): {subject}")
+    elif force_reprocess:
+        add_log("📭 No insurance emails found in last 3 days")
+    else:
+        add_log("📭 No new unread insurance emails found")
+    return False
 
-def display_google_drive_button(email_result):
+def build_display_fields(email_result):
     """
-    Display a clickable Google Drive button with email information.
+    Precompute the display strings for an email result.
+    
+    Called once when a result is ingested so reruns don't redo the
+    truncation and HTML formatting for every processed email.
     
     Args:
         email_result (dict): Dictionary containing email processing results
+        
+    Returns:
+        dict: Truncated subject/sender, button text and Google Drive link HTML
     """
     # Extract email metadata for button display
     metadata = email_result.get('email_metadata', {})
@@ -187,17 +469,8 @@ def display_google_drive_button(email_result):
     display_sender = sender.split('<')[0].strip() if '<' in sender else sender
     display_sender = display_sender[:30] + "..." if len(display_sender) > 30 else display_sender
     
-    # Create button text with subject and sender info
-    button_text = f"📧 {display_subject}\n👤 From: {display_sender}"
-    
-    if drive_link:
-        # Create clickable button that opens Google Drive folder
-        if st.button(button_text, key=f"drive_{email_result.get('processed_at', '')}", use_container_width=True):
-            st.balloons()  # Fun animation when clicked
-            st.success(f"🚀 Opening Google Drive folder...")
-        
-        # Also provide a direct link for backup access
-        st.markdown(f"""
+    # Direct link for backup access
+    drive_html = f"""
         <div style="text-align: center; margin: 5px 0;">
             <a href="{drive_link}" target="_blank" style="
                 background: linear-gradient(45deg, #4285f4, #34a853);
@@ -211,32 +484,130 @@ def display_google_drive_button(email_result):
                 🔗 Open in Google Drive
             </a>
         </div>
-        """, unsafe_allow_html=True)
+        """ if drive_link else None
+    
+    # Quick access link for the "Recent Google Drive Links" panel
+    short_subject = subject[:25] + "..." if len(subject) > 25 else subject
+    sidebar_html = f"""
+                    <div style="margin: 5px 0;">
+                        <a href="{drive_link}" target="_blank" style="
+                            background: #e8f5e8;
+                            color: #2d5a2d;
+                            padding: 8px;
+                            text-decoration: none;
+                            border-radius: 5px;
+                            font-size: 12px;
+                            display: block;
+                            border: 1px solid #c8e6c9;
+                        ">
+                            📁 {short_subject}
+                        </a>
+                    </div>
+                    """ if drive_link else None
+    
+    return {
+        'subject': display_subject,
+        'sender': display_sender,
+        # Button text with subject and sender info
+        'button_text': f"📧 {display_subject}\n👤 From: {display_sender}",
+        'drive_html': drive_html,
+        'sidebar_html': sidebar_html
+    }
+
+def display_google_drive_button(email_result):
+    """
+    Display a clickable Google Drive button with email information.
+    
+    Args:
+        email_result (dict): Dictionary containing email processing results
+    """
+    display = email_result.get('_display') or build_display_fields(email_result)
+    
+    if display['drive_html']:
+        # Create clickable button that opens Google Drive folder
+        if st.button(display['button_text'], key=f"drive_{email_result.get('processed_at', '')}", use_container_width=True):
+            st.balloons()  # Fun animation when clicked
+            st.success(f"🚀 Opening Google Drive folder...")
+        
+        # Also provide a direct link for backup access
+        st.markdown(display['drive_html'], unsafe_allow_html=True)
     else:
-        st.error(f"❌ Google Drive upload failed for: {display_subject}")
+        st.error(f"❌ Google Drive upload failed for: {display['subject']}")
+
+@st.cache_data(show_spinner=False)
+def invoice_to_csv(invoice_data):
+    """
+    Convert invoice rows to CSV once per dataset.
+    
+    Args:
+        invoice_data (list): List of invoice row dictionaries
+        
+    Returns:
+        tuple: (csv_text, digest) where digest is a short content hash of the CSV
+    """
+    if len(invoice_data) < SMALL_INVOICE_ROWS:
+        # Small tables: stream rows straight to CSV, skipping DataFrame construction
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(invoice_data[0].keys()), lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(invoice_data)
+        csv_text = buffer.getvalue()
+    else:
+        csv_text = pd.DataFrame(invoice_data).to_csv(index=False)
+    digest = hashlib.blake2b(csv_text.encode('utf-8'), digest_size=8).hexdigest()
+    return csv_text, digest
+
+@st.cache_resource(show_spinner=False, max_entries=200)
+def invoice_to_dataframe(digest, _invoice_data):
+    """
+    Build the DataFrame for a large invoice table once per dataset.
+    
+    Cached as a resource so reruns reuse the same DataFrame object instead of
+    rebuilding (or unpickling a copy of) it.
+    
+    Args:
+        digest (str): Content hash of the invoice data, used as the cache key
+        _invoice_data (list): List of invoice row dictionaries (not hashed)
+        
+    Returns:
+        pandas.DataFrame: The invoice table
+    """
+    return pd.DataFrame(_invoice_data)
 
-def display_invoice_data(invoice_data):
+def display_invoice_data(invoice_data, processed_at=None):
     """
     Display invoice data in a formatted table with download option.
     
     Args:
         invoice_data: Pandas DataFrame or list containing invoice data
+        processed_at (str): ISO timestamp of the email result, used for stable widget keys
     """
     # Check if we have any data to display
     if invoice_data and len(invoice_data) > 0:
-        # Convert to DataFrame if it's not already
-        df = pd.DataFrame(invoice_data)
-        # Display as interactive table that fills container width
-        st.dataframe(df, use_container_width=True)
+        # CSV and content hash are cached per dataset
+        csv_text, digest = invoice_to_csv(invoice_data)
+        
+        if len(invoice_data) < SMALL_INVOICE_ROWS:
+            # Small tables render directly from the list of row dictionaries
+            st.table(invoice_data)
+        else:
+            # Reuse the DataFrame built on the first render of this dataset
+            df = invoice_to_dataframe(digest, invoice_data)
+            # Display as interactive table that fills container width
+            st.dataframe(df, use_container_width=True)
         
         # Provide CSV download functionality for the user
-        csv = df.to_csv(index=False)
+        # Stable timestamp (YYYYMMDD_HHMMSS) of the email result, so the widget keeps its identity across reruns
+        if processed_at:
+            stamp = processed_at[:19].replace('-', '').replace(':', '').replace('T', '_')
+        else:
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         # Create unique key based on timestamp and data hash to avoid duplicate IDs
-        unique_key = f"download_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(str(df.values.tobytes())) % 10000}"
+        unique_key = f"download_{stamp}_{digest}"
         st.download_button(
             label="📥 Download Invoice Data as CSV",
-            data=csv,
-            file_name=f"invoice_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            data=csv_text,
+            file_name=f"invoice_data_{stamp}.csv",
             mime="text/csv",
             key=unique_key
         )
@@ -268,10 +639,9 @@ def display_email_summary(email_result):
     # Right column: Processing results summary
     with col2:
         st.write("**📊 Processing Results:**")
-        invoice_data = email_result.get('invoice_data', [])
         uploaded_files = email_result.get('uploaded_files', [])
         
-        st.write(f"**Invoice Items:** {len(invoice_data) if invoice_data else 0}")
+        st.write(f"**Invoice Items:** {DashboardEmailCache.invoice_row_count(email_result)}")
         st.write(f"**Uploaded Files:** {len(uploaded_files) if uploaded_files else 0}")
         
         # Display uploaded files
@@ -281,6 +651,33 @@ def display_email_summary(email_result):
             else:
                 st.write(f"• {file_info}")
 
+@st.fragment
+def render_email_card(email_result):
+    """
+    Render the body of a processed email's expander.
+    
+    Runs as a fragment so interacting with its widgets (Drive button,
+    CSV download) reruns only this card instead of the whole dashboard.
+    
+    Args:
+        email_result (dict): Dictionary containing email processing results
+    """
+    # Google Drive button
+    display_google_drive_button(email_result)
+    
+    # Email summary
+    display_email_summary(email_result)
+    
+    # Invoice data
+    if DashboardEmailCache.invoice_row_count(email_result):
+        st.subheader("📊 Extracted Invoice Data")
+        # Expanders run their body even when collapsed, so older (compressed) tables
+        # are only decompressed once the user asks for them
+        if email_result.get('_invoice_data_compressed') and not st.toggle(
+                "Show invoice data", key=f"show_invoice_{email_result.get('processed_at', '')}"):
+            return
+        display_invoice_data(DashboardEmailCache.invoice_rows(email_result), email_result.get('processed_at'))
+
 def main():
     """
     Main function that creates the Streamlit web interface.
@@ -289,6 +686,12 @@ def main():
     # Initialize session state variables if not already done
     init_session_state()
     
+    # Streamlit drops elements a rerun doesn't re-emit, so the styling is sent every run
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+    
+    # Pick up the results of a background email check that finished since the last run
+    check_running = collect_email_check_results()
+    
     # Create the main header with emoji and styling
     st.markdown('<h1 class="main-header">🚀 Email-to-Invoice Processor</h1>', unsafe_allow_html=True)
     # Add description of what the application does
@@ -329,78 +732,35 @@ def main():
                 else:
                     add_log("❌ Failed to connect to email server")
         
-        if st.button("🔍 Check Emails Once", disabled=not st.session_state.processor):
+        if st.button("🔍 Check Emails Once", disabled=not st.session_state.processor or check_running):
             if st.session_state.processor:
                 add_log("🔍 Starting email check...")
-                with st.spinner("Checking for new emails..."):
-                    try:
-                        # Check for unread emails (not force reprocess by default)
-                        add_log("📬 Looking for unread insurance emails...")
-                        results = st.session_state.processor.check_and_process_emails(force_reprocess=False)
-                        
-                        # Display processing status
-                        if results:
-                            add_log(f"✅ Found {len(results)} new insurance emails")
-                            st.session_state.processed_emails.extend(results)
-                            
-                            # Show what was processed in logs only
-                            for result in results:
-                                email_meta = result.get('email_metadata', {})
-                                subject = email_meta.get('subject', 'Unknown Subject')
-                                add_log(f"📧 Processed: {subject}")
-                                if result.get('drive_link'):
-                                    add_log(f"☁️ Uploaded to Google Drive: {subject}")
-                                else:
-                                    add_log(f"💾 Saved locally (Google Drive failed): {subject}")
-                        else:
-                            add_log("📭 No new unread insurance emails found")
-                            
-                    except Exception as e:
-                        error_msg = f"❌ Error: {str(e)}"
-                        add_log(error_msg)
-                        import traceback
-                        add_log(f"Error details: {traceback.format_exc()}")
+                # Check for unread emails (not force reprocess by default)
+                add_log("📬 Looking for unread insurance emails...")
+                check_emails_once(st.session_state.processor, force_reprocess=False)
                 st.rerun()
         
         # Add a separate button for force reprocess (check all emails from last 3 days)
-        if st.button("🔄 Force Check All Emails (Last 3 Days)", disabled=not st.session_state.processor):
+        if st.button("🔄 Force Check All Emails (Last 3 Days)", disabled=not st.session_state.processor or check_running):
             if st.session_state.processor:
                 add_log("🔄 Starting force check of all emails from last 3 days...")
-                with st.spinner("Checking all emails from last 3 days..."):
-                    try:
-                        # Force reprocess to get all emails from last 3 days
-                        add_log("📬 Searching all emails from last 3 days...")
-                        results = st.session_state.processor.check_and_process_emails(force_reprocess=True)
-                        
-                        if results:
-                            add_log(f"✅ Found {len(results)} insurance emails from last 3 days")
-                            st.session_state.processed_emails.extend(results)
-                            
-                            # Show what was processed in logs only
-                            for result in results:
-                                email_meta = result.get('email_metadata', {})
-                                subject = email_meta.get('subject', 'Unknown Subject')
-                                add_log(f"📧 Processed: {subject}")
-                                if result.get('drive_link'):
-                                    add_log(f"☁️ Uploaded to Google Drive: {subject}")
-                                else:
-                                    add_log(f"💾 Saved locally (Google Drive failed): {subject}")
-                        else:
-                            add_log("📭 No insurance emails found in last 3 days")
-                            
-                    except Exception as e:
-                        error_msg = f"❌ Error: {str(e)}"
-                        add_log(error_msg)
-                        import traceback
-                        add_log(f"Error details: {traceback.format_exc()}")
+                # Force reprocess to get all emails from last 3 days
+                add_log("📬 Searching all emails from last 3 days...")
+                check_emails_once(st.session_state.processor, force_reprocess=True)
                 st.rerun()
         
+        # Show progress while the background check is running
+        if check_running:
+            st.info("⏳ Checking for new emails in the background...")
+            # Poll quickly until the background check completes
+            st_autorefresh(interval=2_000, limit=None, key="email_check_poll")
+        
         # Add reset button
-        if st.button("🔄 Reset Email Cache", disabled=not st.session_state.processor):
+        if st.button("🔄 Reset Email Cache", disabled=not st.session_state.processor or check_running):
             if st.session_state.processor:
                 add_log("🔄 Resetting email cache...")
                 st.session_state.processor.reset_seen_emails()
-                st.session_state.processed_emails = []  # Clear dashboard cache too
+                st.session_state.processed_emails.clear()  # Clear dashboard cache too
                 add_log("✅ Email cache reset successfully")
                 st.success("🔄 Email cache reset!")
                 st.rerun()
@@ -415,12 +775,12 @@ def main():
             # Create a container for scrollable logs
             log_container = st.container()
             with log_container:
-                # Show logs in reverse order (newest first)
-                for log in reversed(st.session_state.processing_logs[-15:]):  # Show last 15 logs
-                    st.text(log)
+                # Show the last 15 logs in reverse order (newest first) as a single element
+                logs_str = "\n".join(islice(reversed(st.session_state.processing_logs), 15))
+                st.code(logs_str, language=None)
             
             if st.button("�️ Clear Logs", key="clear_logs_main"):
-                st.session_state.processing_logs = []
+                st.session_state.processing_logs.clear()
                 st.rerun()
         else:
             st.info("🔄 Processing logs will appear here...")
@@ -432,37 +792,13 @@ def main():
             # Show emails in reverse order (newest first)
             for i, email_result in enumerate(reversed(st.session_state.processed_emails)):
                 with st.expander(f"📧 Email {len(st.session_state.processed_emails) - i}: {email_result['email_metadata']['subject'][:60]}{'...' if len(email_result['email_metadata']['subject']) > 60 else ''}", expanded=False):
-                    
-                    # Google Drive button
-                    display_google_drive_button(email_result)
-                    
-                    # Email summary
-                    display_email_summary(email_result)
-                    
-                    # Invoice data
-                    if email_result.get('invoice_data'):
-                        st.subheader("📊 Extracted Invoice Data")
-                        display_invoice_data(email_result['invoice_data'])
+                    render_email_card(email_result)
         else:
             st.header("🎯 Quick Start")
             st.info("👋 Connect to email and check for emails to get started!")
             
             # Show instructions
-            st.markdown("""
-            ## 🎯 How it works:
-            
-            1. **📧 Connect** to your Gmail account using app password
-            2. **🔍 Check emails** for insurance-related messages with PDF attachments
-            3. **📄 Extract data** from PDF invoices using OCR and AI
-            4. **📊 Display results** in a structured table format
-            5. **☁️ Upload to Google Drive** with CSV, metadata, and original files
-            6. **🔗 Get shareable link** to the Google Drive folder
-            
-            ### 📋 What gets uploaded to Google Drive:
-            - **📊 CSV file** with extracted invoice data
-            - **📝 JSON metadata** with email details
-            - **📎 Original PDF/image** attachments
-            """)
+            st.markdown(HOW_IT_WORKS_MD)
     
     with main_col2:
         # Statistics and Quick Actions
@@ -488,35 +824,17 @@ def main():
         if st.session_state.processed_emails:
             st.subheader("🎯 Recent Google Drive Links")
             # Show last 5 processed emails as quick access buttons
-            for email_result in list(reversed(st.session_state.processed_emails))[:5]:
-                metadata = email_result.get('email_metadata', {})
-                subject = metadata.get('subject', 'Unknown')[:25] + "..." if len(metadata.get('subject', '')) > 25 else metadata.get('subject', 'Unknown')
-                drive_link = email_result.get('drive_link')
-                
-                if drive_link:
-                    st.markdown(f"""
-                    <div style="margin: 5px 0;">
-                        <a href="{drive_link}" target="_blank" style="
-                            background: #e8f5e8;
-                            color: #2d5a2d;
-                            padding: 8px;
-                            text-decoration: none;
-                            border-radius: 5px;
-                            font-size: 12px;
-                            display: block;
-                            border: 1px solid #c8e6c9;
-                        ">
-                            📁 {subject}
-                        </a>
-                    </div>
-                    """, unsafe_allow_html=True)
+            for email_result in islice(reversed(st.session_state.processed_emails), 5):
+                display = email_result.get('_display') or build_display_fields(email_result)
+                if display['sidebar_html']:
+                    st.markdown(display['sidebar_html'], unsafe_allow_html=True)
         
         # Auto-refresh section
         st.subheader("🔄 Auto Refresh")
         if st.session_state.processor:
             st.info("Auto-refreshing every 30 seconds...")
-            time.sleep(30)
-            st.rerun()
+            # Let the browser schedule the rerun instead of blocking this script thread
+            st_autorefresh(interval=30_000, limit=None, key="email_refresh")
         else:
             st.warning("Connect to enable auto-refresh")
 
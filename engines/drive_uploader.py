@@ -1,22 +1,44 @@
 import os
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+import google_auth_httplib2
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaInMemoryUpload
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-import pickle
+from google.oauth2.credentials import Credentials
 import uuid
 
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
-def authenticate_drive():
+# Maximum number of attachment uploads running at the same time
+UPLOAD_WORKERS = 8
+
+# Files above this size use a resumable upload session instead of one multipart request
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+
+# httplib2 connections are not thread-safe, so each upload thread keeps its own
+_thread_local = threading.local()
+
+# Drive client and credentials shared by every save_email_and_attachments call
+_SERVICE = None
+_CREDS = None
+_SERVICE_LOCK = threading.Lock()
+
+# One long-lived pool, so each worker's thread-local connection is reused across emails
+_UPLOAD_EXECUTOR = None
+_UPLOAD_EXECUTOR_LOCK = threading.Lock()
+
+def get_credentials():
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     CREDENTIALS_PATH = os.path.join(BASE_DIR, "oauth2.json")
-    token_path = os.path.join(BASE_DIR, 'token.pickle')
+    token_path = os.path.join(BASE_DIR, 'token.json')
 
     creds = None
     if os.path.exists(token_path):
-        with open(token_path, 'rb') as token:
-            creds = pickle.load(token)
+        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -24,44 +46,113 @@ def authenticate_drive():
         else:
             flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
             creds = flow.run_local_server(port=0)
-        with open(token_path, 'wb') as token:
-            pickle.dump(creds, token)
+        with open(token_path, 'w') as token:
+            token.write(creds.to_json())
+
+    return creds
 
-    return build('drive', 'v3', credentials=creds)
+def authenticate_drive():
+    """Return the shared Drive client instead of re-reading the token and discovery doc per call.
+
+    The client's own httplib2 connection is not thread-safe, so callers off the main
+    thread must pass http=get_thread_http() to every request they execute.
+    """
+    return get_service()
+
+def get_service():
+    """Return the process-wide Drive client, building it on first use."""
+    global _SERVICE, _CREDS
+    # Emails may be saved from several threads at once; build the client only once
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _CREDS = get_credentials()
+            _SERVICE = build('drive', 'v3', credentials=_CREDS, cache_discovery=False)
+    return _SERVICE
+
+def get_upload_executor():
+    """Return the process-wide upload thread pool, creating it on first use."""
+    global _UPLOAD_EXECUTOR
+    with _UPLOAD_EXECUTOR_LOCK:
+        if _UPLOAD_EXECUTOR is None:
+            _UPLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="drive-upload")
+    return _UPLOAD_EXECUTOR
 
-def create_drive_folder(service, folder_name):
+def get_thread_http(creds=None):
+    """Return this thread's authorized HTTP client, reusing its connection across uploads."""
+    # Defaults to the credentials of the shared client from get_service()
+    creds = creds or _CREDS
+    if getattr(_thread_local, 'creds', None) is not creds:
+        _thread_local.creds = creds
+        _thread_local.http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    return _thread_local.http
+
+def create_drive_folder(service, folder_name, http=None):
     file_metadata = {
         'name': folder_name,
         'mimeType': 'application/vnd.google-apps.folder'
     }
-    folder = service.files().create(body=file_metadata, fields='id').execute()
+    folder = service.files().create(body=file_metadata, fields='id').execute(http=http)
     folder_id = folder.get('id')
     print(f"[FOLDER] Created folder: {folder_name} (ID: {folder_id})")
     return folder_id
 
-def upload_file(service, filepath, filename, folder_id=None):
+def upload_file(service, filepath, filename, folder_id=None, http=None):
     file_metadata = {'name': filename}
     if folder_id:
         file_metadata['parents'] = [folder_id]
 
-    media = MediaFileUpload(filepath, resumable=True)
+    # Small files go up in a single multipart POST; only large ones need the resumable session
+    media = MediaFileUpload(filepath, resumable=os.path.getsize(filepath) > RESUMABLE_THRESHOLD)
     file = service.files().create(
         body=file_metadata,
         media_body=media,
         fields='id'
-    ).execute()
+    ).execute(http=http)
     print(f"[UPLOAD] Uploaded: {filename} (ID: {file.get('id')})")
+    return file.get('id')
+
+def upload_bytes(service, data, filename, folder_id=None, mimetype='application/octet-stream', http=None):
+    file_metadata = {'name': filename}
+    if folder_id:
+        file_metadata['parents'] = [folder_id]
+
+    media = MediaInMemoryUpload(data, mimetype=mimetype)
+    file = service.files().create(
+        body=file_metadata,
+        media_body=media,
+        fields='id'
+    ).execute(http=http)
+    print(f"[UPLOAD] Uploaded: {filename} (ID: {file.get('id')})")
+    return file.get('id')
+
+def upload_files_concurrently(service, files, folder_id=None, creds=None):
+    """Upload (filepath or bytes, filename) pairs in parallel and return their file IDs in order."""
+    # Defaults to the credentials of the shared client from get_service()
+    creds = creds or _CREDS
+
+    def upload(file):
+        source, filename = file
+        http = get_thread_http(creds)
+        if isinstance(source, bytes):
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            return upload_bytes(service, source, filename, folder_id, mimetype=mimetype, http=http)
+        return upload_file(service, source, filename, folder_id, http=http)
+
+    # Must not be called from an upload worker itself, or it could wait on its own pool
+    return list(get_upload_executor().map(upload, files))
 
 def save_email_and_attachments(to, cc, subject, body, attachments_dir):
-    service = authenticate_drive()
+    service = get_service()
+    # This may run on several threads at once, so never use the service's shared connection
+    http = get_thread_http(_CREDS)
 
     # Create a unique folder per email
     folder_name = f"Email_{uuid.uuid4().hex[:8]}"
-    folder_id = create_drive_folder(service, folder_name)
+    folder_id = create_drive_folder(service, folder_name, http=http)
     print(f"[FOLDER] Created folder: {folder_name} (ID: {folder_id})")
     print(f"[DRIVE_LINK] https://drive.google.com/drive/folders/{folder_id}")
 
-    # Step 1: Save email metadata to a .txt file
+    # Step 1: Upload email metadata as a .txt file straight from memory
     metadata_text = f"""To: {to}
 Cc: {cc}
 Subject: {subject}
@@ -69,20 +160,15 @@ Subject: {subject}
 Body:
 {body}
 """
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    temp_metadata_path = os.path.join(BASE_DIR, 'email_metadata.txt')
-    with open(temp_metadata_path, 'w', encoding='utf-8') as f:
-        f.write(metadata_text)
-
-    # Upload metadata file
-    upload_file(service, temp_metadata_path, "email_metadata.txt", folder_id)
-    os.remove(temp_metadata_path)
+    upload_bytes(service, metadata_text.encode('utf-8'), "email_metadata.txt", folder_id, mimetype='text/plain', http=http)
 
-    # Step 2: Upload each attachment file
+    # Step 2: Upload all attachment files in parallel
     if os.path.exists(attachments_dir):
+        files = []
         for filename in os.listdir(attachments_dir):
             full_path = os.path.join(attachments_dir, filename)
             if os.path.isfile(full_path):
-                upload_file(service, full_path, filename, folder_id)
+                files.append((full_path, filename))
+        upload_files_concurrently(service, files, folder_id)
     else:
         print(f"[WARNING] Attachments directory not found: {attachments_dir}")
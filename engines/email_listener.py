@@ -18,15 +18,248 @@ Key Features:
 
 # Standard library imports for email operations
 import os
+import re
+import json
+import binascii
 import time
+import queue
+import select
+import ssl
+import functools
 import imaplib  # IMAP client for Gmail connection
 import email    # Email parsing and handling
 from email.header import decode_header  # Decode email headers properly
-from datetime import datetime, timedelta  # Date handling for email filtering
+from email.parser import BytesHeaderParser  # Parses headers only, never the MIME body
+from datetime import date, datetime  # Date handling for email filtering
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 
 # Import our Google Drive uploader for saving processed emails
 from drive_uploader import save_email_and_attachments
 
+# Pulls the UID out of a FETCH response line such as b'12 (UID 345 RFC822 {2048}'
+UID_PATTERN = re.compile(rb"UID (\d+)")
+
+# Subject keywords that indicate insurance-related emails, matched in one case-insensitive pass
+INSURANCE_KEYWORDS = ["insurance", "policy", "premium", "claim", "renewal"]
+INSURANCE_SUBJECT_PATTERN = re.compile("|".join(map(re.escape, INSURANCE_KEYWORDS)), re.IGNORECASE)
+# Same keywords as an IMAP search key: OR OR ... SUBJECT "insurance" SUBJECT "policy" ...
+# Only a valid prefilter where SUBJECT is an RFC 3501 substring match; see insurance_search
+INSURANCE_SUBJECT_SEARCH = "OR " * (len(INSURANCE_KEYWORDS) - 1) + " ".join(
+    f'SUBJECT "{keyword}"' for keyword in INSURANCE_KEYWORDS
+)
+
+# Advertised by Gmail, whose SEARCH SUBJECT matches whole words instead of substrings,
+# so SUBJECT "claim" misses "Claims" while the keyword pattern above matches it
+GMAIL_CAPABILITY = "X-GM-EXT-1"
+
+# Base64 text is decoded and written in slices of this size instead of all at once
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Gmail allows 15 simultaneous IMAP connections per account; keep well under that
+IMAP_POOL_SIZE = 3
+
+# Highest UID already handled, kept across restarts so old mail is not re-fetched
+STATE_FILE = os.path.join("data", "state", "highest_uid.json")
+
+# Gmail ends IDLE after about 30 minutes, so re-issue it a little before that
+IDLE_TIMEOUT = 29 * 60
+IDLE_TAG = b"IDLE0"
+
+# Send NOOP on a quiet connection this often so the server does not drop it
+KEEPALIVE_INTERVAL = 5 * 60
+
+# Errors that mean the IMAP connection is gone and has to be re-opened
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError)
+
+# Drive uploads running alongside the IMAP fetches
+UPLOAD_POOL_SIZE = 4
+
+# Insurance emails downloaded per pooled FETCH; small so one large attachment only holds up its own batch
+BODY_BATCH_SIZE = 10
+
+# Headers needed to decide whether an email is insurance-related; PEEK leaves \Seen untouched
+HEADER_FETCH_PARTS = "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM TO CC DATE)])"
+
+# How many days back inbox searches look
+SEARCH_WINDOW_DAYS = 3
+
+def search_since(days=SEARCH_WINDOW_DAYS):
+    """
+    Return the IMAP SINCE date for a search window ending today.
+    
+    Args:
+        days (int): Window length in days
+        
+    Returns:
+        str: Date such as "01-Jan-2024"
+    """
+    # The window only moves at midnight, so the string is rebuilt once per day, not per poll
+    return _format_since(date.today().toordinal(), days)
+
+@functools.lru_cache(maxsize=1)
+def _format_since(today, days):
+    since = date.fromordinal(today - days)
+    return f"{since.day:02d}-{since.strftime('%b')}-{since.year}"
+
+def build_sequence_set(uids):
+    """
+    Build a compact IMAP sequence set from a list of UIDs.
+    
+    Consecutive UIDs are collapsed into ranges, e.g. [1, 5, 7, 8, 9, 10]
+    becomes b"1,5,7:10", keeping FETCH command lines short.
+    
+    Args:
+        uids (list): Message UIDs as bytes or ints
+        
+    Returns:
+        bytes: IMAP sequence set
+    """
+    numbers = sorted({int(uid) for uid in uids})
+    runs = []
+    for number in numbers:
+        if runs and number == runs[-1][1] + 1:
+            runs[-1][1] = number
+        else:
+            runs.append([number, number])
+    return b",".join(
+        str(start).encode() if start == end else f"{start}:{end}".encode()
+        for start, end in runs
+    )
+
+def fast_decode(header_val):
+    """
+    Decode an RFC 2047 header value, skipping the parser for plain headers.
+    
+    Most subjects and filenames contain no encoded words, so they are
+    returned as-is without going through decode_header.
+    
+    Args:
+        header_val (str): Raw header value from email
+        
+    Returns:
+        str: Decoded header string
+    """
+    if isinstance(header_val, str) and "=?" not in header_val:
+        return header_val
+
+    decoded_string = ''
+    # Process each part of the header (may have multiple encoded sections)
+    for part, encoding in decode_header(header_val):
+        if isinstance(part, bytes):
+            # Decode bytes using specified encoding or UTF-8 as fallback
+            decoded_string += part.decode(encoding or 'utf-8', errors='ignore')
+        else:
+            # Already a string, just append
+            decoded_string += part
+    return decoded_string
+
+def write_payload(part, filepath):
+    """
+    Write a MIME part's decoded payload to disk.
+    
+    Base64 parts are decoded in STREAM_CHUNK_SIZE slices, so a large
+    attachment never exists as a second fully decoded copy in memory.
+    
+    Args:
+        part: Email message part holding the attachment
+        filepath (str): Destination file path
+    """
+    if str(part.get("Content-Transfer-Encoding", "")).strip().lower() != "base64":
+        with open(filepath, "wb") as f:
+            f.write(part.get_payload(decode=True) or b"")
+        return
+
+    raw = part.get_payload(decode=False)
+    pending = b""
+    with open(filepath, "wb", buffering=1024 * 1024) as f:
+        for start in range(0, len(raw), STREAM_CHUNK_SIZE):
+            chunk = pending + raw[start:start + STREAM_CHUNK_SIZE].encode("ascii", "ignore").translate(None, b"\r\n \t")
+            # Base64 decodes in groups of 4 characters; carry the remainder over
+            usable = len(chunk) - len(chunk) % 4
+            f.write(binascii.a2b_base64(chunk[:usable]))
+            pending = chunk[usable:]
+        if pending:
+            f.write(binascii.a2b_base64(pending + b"=" * (-len(pending) % 4)))
+
+def attachment_dir_for(uid=None):
+    """
+    Return the directory that holds one email's attachments.
+    
+    Named after the UID when known, so retries reuse the same directory and
+    two emails can never share one; otherwise a microsecond timestamp is used.
+    
+    Args:
+        uid (bytes or str): Message UID, if known
+        
+    Returns:
+        str: Attachment directory path (not created)
+    """
+    if uid is not None:
+        name = uid.decode() if isinstance(uid, bytes) else str(uid)
+    else:
+        name = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    return os.path.join("attachments", f"email_{name}")
+
+class UidBitmap:
+    """
+    Set of message UIDs stored as one bit per UID.
+    
+    UIDs are small increasing integers within a mailbox, so a bitmap offset
+    from the lowest UID added is far smaller than a set of bytes objects and
+    membership is a single index lookup.
+    """
+
+    __slots__ = ("base", "bits")
+
+    def __init__(self):
+        self.base = None  # UID of bit 0; set by the first add()
+        self.bits = bytearray()
+
+    def add(self, uid):
+        """
+        Mark a UID as seen.
+        
+        Args:
+            uid (bytes, str or int): Message UID
+        """
+        uid = int(uid)
+        if self.base is None:
+            self.base = uid
+        elif uid < self.base:
+            # Grow downwards by whole bytes so the existing bits keep their positions
+            extra_bytes = (self.base - uid + 7) // 8
+            self.bits[:0] = bytes(extra_bytes)
+            self.base -= extra_bytes * 8
+        offset = uid - self.base
+        index = offset >> 3
+        if index >= len(self.bits):
+            self.bits.extend(bytes(index + 1 - len(self.bits)))
+        self.bits[index] |= 1 << (offset & 7)
+
+    def update(self, uids):
+        """
+        Mark every UID in uids as seen.
+        
+        Args:
+            uids (iterable): Message UIDs
+        """
+        for uid in uids:
+            self.add(uid)
+
+    def __contains__(self, uid):
+        if self.base is None:
+            return False
+        offset = int(uid) - self.base
+        index = offset >> 3
+        return 0 <= offset and index < len(self.bits) and bool(self.bits[index] & (1 << (offset & 7)))
+
+    def clear(self):
+        """
+        Forget every UID.
+        """
+        self.base = None
+        self.bits = bytearray()
+
 class EmailListener:
     """
     Gmail IMAP client for monitoring and processing emails.
@@ -38,34 +271,284 @@ class EmailListener:
     - Download and process email attachments
     - Track processed emails to avoid duplicates
     """
+
+    # Fixed attribute layout: no per-instance __dict__
+    __slots__ = (
+        "email_address", "app_password", "imap", "seen_uids", "pool_size",
+        "imap_pool", "state_file", "highest_uid", "uid_validity", "upload_pool",
+        "last_activity",
+    )
     
-    def __init__(self, email_address, app_password):
+    def __init__(self, email_address, app_password, pool_size=IMAP_POOL_SIZE):
         """
         Initialize the email listener with Gmail credentials.
         
         Args:
             email_address (str): Gmail address for IMAP connection
             app_password (str): Gmail app password (not regular password)
+            pool_size (int): Number of extra connections used for parallel body fetches
         """
         self.email_address = email_address
         self.app_password = app_password
         self.imap = None  # Will hold the IMAP connection object
-        self.seen_uids = set()  # Track processed email UIDs to avoid duplicates
+        self.seen_uids = UidBitmap()  # Track processed email UIDs to avoid duplicates
+        self.pool_size = pool_size
+        self.imap_pool = None  # Queue of worker connections, opened on first use
+        self.state_file = STATE_FILE
+        self.highest_uid = 0  # Every UID at or below this has already been handled
+        self.uid_validity = None  # UIDs are only comparable while UIDVALIDITY is unchanged
+        # Uploads run here so a pooled IMAP connection moves on to the next message right away
+        self.upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_POOL_SIZE)
+        self.last_activity = time.monotonic()  # Last successful command on the main connection
+        self.load_state()
+
+    def load_state(self):
+        """
+        Load the highest handled UID and its UIDVALIDITY from the state file.
+        """
+        try:
+            with open(self.state_file, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.highest_uid = int(state.get("highest_uid", 0))
+        self.uid_validity = state.get("uidvalidity")
+
+    def save_state(self):
+        """
+        Atomically rewrite the state file with the current highest UID.
+        """
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        temp_path = self.state_file + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"highest_uid": self.highest_uid, "uidvalidity": self.uid_validity}, f)
+        # Rename is atomic, so a crash never leaves a half-written state file
+        os.replace(temp_path, self.state_file)
+
+    def check_uid_validity(self):
+        """
+        Compare the mailbox UIDVALIDITY with the stored one.
+        
+        If the server renumbered the mailbox, stored UIDs are meaningless and
+        the highest UID is reset so the whole search window is scanned again.
+        """
+        typ, data = self.imap.response("UIDVALIDITY")
+        uid_validity = int(data[0]) if data and data[0] else None
+        if uid_validity != self.uid_validity:
+            if self.uid_validity is not None:
+                print("[WARNING] UIDVALIDITY changed, resetting UID cache.")
+            self.uid_validity = uid_validity
+            self.highest_uid = 0
+            self.seen_uids.clear()
+            self.save_state()
+
+    def advance_highest_uid(self, uids):
+        """
+        Record that every UID up to the largest of uids has been handled.
+        
+        Args:
+            uids (list): Message UIDs as bytes
+        """
+        if not uids:
+            return
+        highest = max(int(uid) for uid in uids)
+        if highest > self.highest_uid:
+            self.highest_uid = highest
+            self.save_state()
+
+    def search_new_uids(self, criteria):
+        """
+        Search for messages above the highest handled UID.
+        
+        Args:
+            criteria (str): Extra IMAP search keys, e.g. "UNSEEN SINCE 01-Jan-2024"
+            
+        Returns:
+            list or None: New UIDs as bytes, or None if the search failed
+        """
+        status, messages = self.safe_uid("search", None, f'(UID {self.highest_uid + 1}:* {criteria})')
+        if status != "OK":
+            return None
+        # "n:*" always matches the newest message, even when its UID is below n
+        return [
+            uid for uid in messages[0].split()
+            if int(uid) > self.highest_uid and uid not in self.seen_uids
+        ]
+
+    def insurance_search(self, criteria):
+        """
+        Add the insurance subject prefilter to search criteria where it loses no mail.
+        
+        RFC 3501 servers match SUBJECT as a substring, like INSURANCE_SUBJECT_PATTERN,
+        so the server can drop non-insurance mail. Gmail matches whole words, so there
+        the search is left unfiltered and the header screen alone decides.
+        
+        Args:
+            criteria (str): IMAP search keys, e.g. "UNSEEN SINCE 01-Jan-2024"
+            
+        Returns:
+            str: The criteria, with INSURANCE_SUBJECT_SEARCH appended if the server allows it
+        """
+        if GMAIL_CAPABILITY in self.imap.capabilities:
+            return criteria
+        return f"{criteria} {INSURANCE_SUBJECT_SEARCH}"
+
+    def open_connection(self):
+        """
+        Open a new logged-in IMAP connection with the inbox selected.
+        
+        Returns:
+            imaplib.IMAP4_SSL: Ready-to-use IMAP connection
+        """
+        # Create secure IMAP connection to Gmail
+        imap = imaplib.IMAP4_SSL("imap.gmail.com")
+        # Login with app password (more secure than regular password)
+        imap.login(self.email_address, self.app_password)
+        # Select the inbox folder for email operations
+        imap.select("inbox")
+        return imap
 
     def connect(self):
         """
         Establish secure IMAP connection to Gmail server.
         This must be called before any email operations.
+        
+        Any previous main connection is closed first, so reconnecting after a
+        drop never leaves the old socket open.
         """
+        if self.imap is not None:
+            # Usually called because the old connection broke, so skip LOGOUT and
+            # just release the socket instead of waiting on a dead server
+            try:
+                self.imap.shutdown()
+            except OSError:
+                pass
+            self.imap = None
         print("[CONNECT] Connecting to Gmail via IMAP...")
-        # Create secure IMAP connection to Gmail
-        self.imap = imaplib.IMAP4_SSL("imap.gmail.com")
-        # Login with app password (more secure than regular password)
-        self.imap.login(self.email_address, self.app_password)
-        # Select the inbox folder for email operations
-        self.imap.select("inbox")
+        self.imap = self.open_connection()
+        self.check_uid_validity()
+        self.last_activity = time.monotonic()
         print("[SUCCESS] Connected.")
 
+    def safe_uid(self, *args):
+        """
+        Run a UID command on the main connection, reconnecting once if it dropped.
+        
+        Args:
+            *args: Arguments for imaplib's uid(), e.g. ("search", None, "ALL")
+            
+        Returns:
+            tuple: (status, data) from the server
+        """
+        try:
+            result = self.imap.uid(*args)
+        except CONNECTION_ERRORS:
+            print("[WARNING] IMAP connection dropped, reconnecting...")
+            self.connect()
+            result = self.imap.uid(*args)
+        self.last_activity = time.monotonic()
+        return result
+
+    def keepalive(self):
+        """
+        Send NOOP if the main connection has been quiet for KEEPALIVE_INTERVAL.
+        
+        Reconnects right away if the NOOP shows the connection is gone.
+        """
+        if time.monotonic() - self.last_activity < KEEPALIVE_INTERVAL:
+            return
+        try:
+            self.imap.noop()
+        except CONNECTION_ERRORS:
+            print("[WARNING] IMAP connection dropped, reconnecting...")
+            self.connect()
+        self.last_activity = time.monotonic()
+
+    def get_pool(self):
+        """
+        Return the worker connection pool, opening it on first use.
+        
+        Each worker thread checks a connection out of the queue, so no two
+        threads ever share an imaplib object.
+        
+        Returns:
+            queue.Queue: Pool of pool_size IMAP connections; a slot may hold None
+                after a failed reconnect, so take connections out with checkout()
+        """
+        if self.imap_pool is None:
+            pool = queue.Queue()
+            for _ in range(self.pool_size):
+                pool.put(self.open_connection())
+            self.imap_pool = pool
+        return self.imap_pool
+
+    def disconnect(self):
+        """
+        Log out of the main connection and every pooled connection.
+        """
+        connections = [self.imap] if self.imap else []
+        if self.imap_pool is not None:
+            while not self.imap_pool.empty():
+                connections.append(self.imap_pool.get_nowait())
+            self.imap_pool = None
+        for imap in connections:
+            if imap is None:
+                continue  # Slot left empty by a failed reconnect
+            try:
+                imap.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+        self.imap = None
+
+    def fetch_messages(self, uids, batch_size=50, message_parts="(RFC822)", imap=None):
+        """
+        Fetch messages for many UIDs with one IMAP FETCH per batch.
+        
+        Each FETCH round trip returns up to batch_size messages instead of one,
+        so N new emails cost about N / batch_size round trips.
+        
+        Args:
+            uids (list): Message UIDs as bytes
+            batch_size (int): Maximum number of UIDs per FETCH command
+            message_parts (str): FETCH data items, e.g. "(RFC822)" or "(BODY.PEEK[])"
+            imap: Connection to fetch on, defaults to the main connection
+            
+        Yields:
+            tuple: (uid, raw_bytes) for every message returned by the server
+        """
+        # The main connection reconnects on its own; pooled ones are replaced by process_batch
+        uid_command = imap.uid if imap is not None else self.safe_uid
+        for start in range(0, len(uids), batch_size):
+            batch = uids[start:start + batch_size]
+            status, msg_data = uid_command("fetch", build_sequence_set(batch), message_parts)
+            if status != "OK":
+                print(f"[WARNING] Failed to fetch {len(batch)} messages.")
+                continue
+
+            # Message parts come back as (envelope, body) tuples interleaved with b')' closers
+            for index, item in enumerate(msg_data):
+                if not isinstance(item, tuple):
+                    continue
+                match = UID_PATTERN.search(item[0])
+                # Some servers send the UID after the literal, in the closing line
+                if not match and index + 1 < len(msg_data) and isinstance(msg_data[index + 1], bytes):
+                    match = UID_PATTERN.search(msg_data[index + 1])
+                uid = match.group(1) if match else None
+                yield uid, item[1]
+
+    def fetch_headers(self, uids, batch_size=100):
+        """
+        Fetch only the headers needed for insurance screening.
+        
+        Args:
+            uids (list): Message UIDs as bytes
+            batch_size (int): Maximum number of UIDs per FETCH command
+            
+        Yields:
+            tuple: (uid, raw_headers) for every message returned by the server
+        """
+        return self.fetch_messages(uids, batch_size, HEADER_FETCH_PARTS)
+
     def is_insurance_email(self, msg):
         """
         Check if an email is related to insurance based on subject keywords.
@@ -76,19 +559,28 @@ class EmailListener:
         Returns:
             bool: True if email appears to be insurance-related, False otherwise
         """
-        subject = msg["Subject"]
-        if subject:
-            # Decode the subject header properly (handles encoding)
-            decoded_subject, encoding = decode_header(subject)[0]
-            if isinstance(decoded_subject, bytes):
-                decoded_subject = decoded_subject.decode(encoding or "utf-8", errors="ignore")
-            
-            # List of keywords that indicate insurance-related emails
-            keywords = ["insurance", "policy", "premium", "claim", "renewal"]
+        decoded_subject = self.get_subject(msg)
+        if decoded_subject:
             # Check if any insurance keywords appear in the subject (case-insensitive)
-            return any(keyword in decoded_subject.lower() for keyword in keywords)
+            return INSURANCE_SUBJECT_PATTERN.search(decoded_subject) is not None
         return False
 
+    def get_subject(self, msg):
+        """
+        Return the decoded subject, decoding it at most once per message.
+        
+        Args:
+            msg: Email message object
+            
+        Returns:
+            str: Decoded subject, or an empty string if there is none
+        """
+        decoded_subject = msg.__dict__.get("_decoded_subject")
+        if decoded_subject is None:
+            decoded_subject = self.get_decoded(msg.get("Subject", ""))
+            msg.__dict__["_decoded_subject"] = decoded_subject
+        return decoded_subject
+
     def get_decoded(self, header_val):
         """
         Properly decode email header values that may be encoded.
@@ -99,18 +591,7 @@ class EmailListener:
         Returns:
             str: Decoded header string
         """
-        decoded_parts = decode_header(header_val)
-        decoded_string = ''
-        
-        # Process each part of the header (may have multiple encoded sections)
-        for part, encoding in decoded_parts:
-            if isinstance(part, bytes):
-                # Decode bytes using specified encoding or UTF-8 as fallback
-                decoded_string += part.decode(encoding or 'utf-8', errors='ignore')
-            else:
-                # Already a string, just append
-                decoded_string += part
-        return decoded_string
+        return fast_decode(header_val)
 
     def extract_email_data(self, msg):
         """
@@ -125,7 +606,7 @@ class EmailListener:
         # Extract basic header information
         to = msg.get("To", "")
         cc = msg.get("Cc", "")
-        subject = self.get_decoded(msg.get("Subject", ""))
+        subject = self.get_subject(msg)
         body = ""
 
         # Extract email body content (handles both plain text and HTML)
@@ -147,19 +628,19 @@ class EmailListener:
 
         return to, cc, subject, body.strip()
 
-    def save_attachments(self, msg):
+    def save_attachments(self, msg, uid=None):
         """
         Download and save all attachments from an email message.
         
         Args:
             msg: Email message object
+            uid (bytes): Message UID, used to name the attachment directory
             
         Returns:
             str or None: Path to attachment directory if attachments found, None otherwise
         """
-        # Create unique directory for this email's attachments
-        attachment_dir = os.path.join("attachments", f"email_{datetime.now().strftime('%Y%m%d%H%M%S')}")
-        os.makedirs(attachment_dir, exist_ok=True)
+        # Unique directory for this email's attachments, created on the first attachment
+        attachment_dir = attachment_dir_for(uid)
         attachment_found = False
 
         # Walk through all parts of the email message
@@ -175,14 +656,12 @@ class EmailListener:
             filename = part.get_filename()
             if filename:
                 # Properly decode filename (may be encoded)
-                decoded_name, encoding = decode_header(filename)[0]
-                if isinstance(decoded_name, bytes):
-                    filename = decoded_name.decode(encoding or "utf-8", errors="ignore")
+                filename = fast_decode(filename)
 
                 # Save attachment to file
-                filepath = os.path.join(attachment_dir, filename)
-                with open(filepath, "wb") as f:
-                    f.write(part.get_payload(decode=True))
+                if not attachment_found:
+                    os.makedirs(attachment_dir, exist_ok=True)
+                write_payload(part, os.path.join(attachment_dir, filename))
 
                 print(f"[ATTACH] Saved attachment: {filename}")
                 attachment_found = True
@@ -190,47 +669,285 @@ class EmailListener:
         # Return directory path if attachments were found, None otherwise
         return attachment_dir if attachment_found else None
 
+    def process_message(self, msg, uid=None):
+        """
+        Extract the email data and save its attachments in a single MIME walk.
+        
+        Equivalent to extract_email_data followed by save_attachments, but the
+        message is walked once. A text/plain body is preferred over text/html.
+        
+        Args:
+            msg: Email message object
+            uid (bytes): Message UID, used to name the attachment directory
+            
+        Returns:
+            tuple: (to, cc, subject, body, attachments_dir) where attachments_dir
+                   is None if the email has no attachments
+        """
+        to = msg.get("To", "")
+        cc = msg.get("Cc", "")
+        subject = self.get_subject(msg)
+        plain_body = None
+        html_body = None
+
+        # Unique directory for this email's attachments, created on the first attachment
+        attachment_dir = attachment_dir_for(uid)
+        attachment_found = False
+
+        for part in msg.walk():
+            # Skip multipart containers
+            if part.get_content_maintype() == "multipart":
+                continue
+            content_type = part.get_content_type()
+            content_disposition = part.get("Content-Disposition")
+
+            # Parts with a disposition and a filename are attachments
+            filename = part.get_filename() if content_disposition is not None else None
+            if filename:
+                filename = fast_decode(filename)
+                if not attachment_found:
+                    os.makedirs(attachment_dir, exist_ok=True)
+                write_payload(part, os.path.join(attachment_dir, filename))
+
+                print(f"[ATTACH] Saved attachment: {filename}")
+                attachment_found = True
+
+            # Single-part emails use their only payload as the body
+            is_body_part = not msg.is_multipart() or (
+                "attachment" not in str(content_disposition) and content_type in ("text/plain", "text/html")
+            )
+            if is_body_part and plain_body is None:
+                payload = part.get_payload(decode=True)
+                charset = part.get_content_charset() or "utf-8"
+                text = payload.decode(charset, errors="ignore") if payload else ""
+                if content_type == "text/html" and msg.is_multipart():
+                    if html_body is None:
+                        html_body = text
+                else:
+                    plain_body = text
+
+        body = plain_body if plain_body is not None else html_body or ""
+        return to, cc, subject, body.strip(), attachment_dir if attachment_found else None
+
     def check_inbox(self):
-        date_since = (datetime.now() - timedelta(days=3)).strftime("%d-%b-%Y")
-        status, messages = self.imap.uid("search", None, f'(UNSEEN SINCE {date_since})')
+        date_since = search_since()
+        # Only ask for UIDs above the last handled one, prefiltered on subject where the server can
+        new_uids = self.search_new_uids(self.insurance_search(f"UNSEEN SINCE {date_since}"))
 
-        if status != "OK":
+        if new_uids is None:
             print("[WARNING] Failed to fetch messages.")
             return
 
-        for uid in messages[0].split():
-            if uid in self.seen_uids:
-                continue
+        self.seen_uids.update(new_uids)
+
+        # Screen on headers only, so non-insurance mail never downloads its body.
+        # This is the authoritative keyword match; the server prefilter is only an optimization.
+        # Each full batch of matches is handed to the pool right away, so body
+        # downloads overlap with screening the remaining header batches.
+        futures = []
+        batch = []
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            for uid, raw_headers in self.fetch_headers(new_uids, batch_size=100):
+                if not self.is_insurance_email(BytesHeaderParser().parsebytes(raw_headers)):
+                    continue
+                batch.append(uid)
+                if len(batch) == BODY_BATCH_SIZE:
+                    futures.append(executor.submit(self.process_batch, self.get_pool(), batch))
+                    batch = []
+            if batch:
+                futures.append(executor.submit(self.process_batch, self.get_pool(), batch))
+
+            # Each fetch batch returns the uploads it queued
+            upload_futures = [upload for future in futures for upload in future.result()]
+
+        # Surface the first failed upload before the UID cache moves past it
+        done, not_done = wait(upload_futures, return_when=FIRST_EXCEPTION)
+        for future in done:
+            future.result()
+
+        # Only advance once every batch went through, so a failure is retried after restart
+        self.advance_highest_uid(new_uids)
+
+    def process_batch(self, pool, uids):
+        """
+        Fetch and handle a batch of insurance emails on a pooled connection.
+        
+        Args:
+            pool (queue.Queue): Connection pool to check a connection out of
+            uids (list): Message UIDs as bytes
+            
+        Returns:
+            list: Futures of the Drive uploads queued for the batch
+        """
+        imap = self.checkout(pool)
+        try:
+            return [
+                self.handle_email(email.message_from_bytes(raw_email), uid)
+                for uid, raw_email in self.fetch_messages(uids, batch_size=len(uids), message_parts="(BODY.PEEK[])", imap=imap)
+            ]
+        except CONNECTION_ERRORS as error:
+            # Replace the broken connection in the pool; the batch is retried next check
+            try:
+                imap.shutdown()
+            except OSError:
+                pass
+            imap = None
+            try:
+                imap = self.open_connection()
+            except (imaplib.IMAP4.error, OSError) as reconnect_error:
+                # Still unreachable: the empty slot is refilled by the next checkout
+                raise error from reconnect_error
+            raise
+        finally:
+            pool.put(imap)
+
+    def checkout(self, pool):
+        """
+        Take a connection out of the pool, reopening a slot left empty by a failed reconnect.
+        
+        Args:
+            pool (queue.Queue): Connection pool from get_pool
+            
+        Returns:
+            imaplib.IMAP4_SSL: Connection to return with pool.put when done
+        """
+        imap = pool.get()
+        if imap is None:
+            try:
+                imap = self.open_connection()
+            except BaseException:
+                pool.put(None)
+                raise
+        return imap
 
-            self.seen_uids.add(uid)
-            _, msg_data = self.imap.uid("fetch", uid, "(RFC822)")
-            raw_email = msg_data[0][1]
-            msg = email.message_from_bytes(raw_email)
+    def handle_email(self, msg, uid=None):
+        """
+        Save the attachments of an insurance email and queue its Drive upload.
+        
+        Args:
+            msg: Email message object
+            uid (bytes): Message UID
+            
+        Returns:
+            concurrent.futures.Future: The queued upload
+        """
+        to, cc, subject, body, attachments_dir = self.process_message(msg, uid)
+        from_ = msg.get("From")
+        date_ = msg.get("Date")
 
-            if not self.is_insurance_email(msg):
-                continue  # Skip non-insurance emails
+        print("\n[EMAIL] Insurance Email received:")
+        print(f"From: {from_}")
+        print(f"To: {to}")
+        print(f"Cc: {cc}")
+        print(f"Subject: {subject}")
+        print(f"Date: {date_}")
+        print("-" * 40)
 
-            to, cc, subject, body = self.extract_email_data(msg)
-            from_ = msg.get("From")
-            date_ = msg.get("Date")
+        return self.upload_pool.submit(save_email_and_attachments, to, cc, subject, body, attachments_dir or "")
 
-            print("\n[EMAIL] Insurance Email received:")
-            print(f"From: {from_}")
-            print(f"To: {to}")
-            print(f"Cc: {cc}")
-            print(f"Subject: {subject}")
-            print(f"Date: {date_}")
-            print("-" * 40)
+    def response_ready(self):
+        """
+        Check, without blocking, whether the server has sent data that is not read yet.
+        
+        Covers all three places a response can wait: imaplib's buffered socket file,
+        records SSL has already decrypted, and the socket itself. select only sees
+        the last one, so it must not be the first thing consulted.
+        
+        Returns:
+            bool: True if readline() has data to return (or the connection hit EOF)
+        """
+        sock = self.imap.sock
+        timeout = sock.gettimeout()
+        # peek() returns buffered bytes as they are and only reads the socket when
+        # the buffer is empty; non-blocking, that read fails instead of waiting
+        sock.setblocking(False)
+        try:
+            return bool(self.imap.file.peek(1))
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def wait_for_mail(self, timeout=IDLE_TIMEOUT):
+        """
+        Block in IMAP IDLE (RFC 2177) until the server reports a mailbox change.
+        
+        Args:
+            timeout (int): Seconds to stay idle before returning anyway
+            
+        Returns:
+            bool: True if the mailbox changed (e.g. new mail), False if the timeout expired
+        """
+        self.imap.send(IDLE_TAG + b" IDLE\r\n")
+
+        # "* OK Still here" is a keepalive; anything else untagged ("* 12 EXISTS",
+        # "* 3 EXPUNGE", ...) is a change
+        def is_change(line):
+            return line.startswith(b"*") and not line.startswith(b"* OK")
 
-            attachments_dir = self.save_attachments(msg)
-            save_email_and_attachments(to, cc, subject, body, attachments_dir or "")
+        # Untagged responses may arrive before the continuation (RFC 2177)
+        changed = False
+        while True:
+            line = self.imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed while entering IDLE")
+            if line.startswith(b"+"):
+                break
+            if not line.startswith(b"*"):
+                raise imaplib.IMAP4.error(f"Server rejected IDLE: {line!r}")
+            changed = changed or is_change(line)
+
+        deadline = time.monotonic() + timeout
+        while not changed:
+            # Wait with select instead of a socket timeout: a read that times out leaves
+            # imaplib's socket file unusable, so DONE could no longer be drained.
+            # Lines that came in the same read as "+ idling" or a keepalive are already
+            # buffered and invisible to select, so those are consumed first
+            if not self.response_ready():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                readable, _, _ = select.select([self.imap.sock], [], [], remaining)
+                if not readable:
+                    break
+            line = self.imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed during IDLE")
+            changed = is_change(line)
+
+        # Leave IDLE and consume everything up to its tagged completion
+        self.imap.send(b"DONE\r\n")
+        while True:
+            line = self.imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed while leaving IDLE")
+            if line.startswith(IDLE_TAG):
+                break
+        self.last_activity = time.monotonic()
+        return changed
 
     def listen(self, interval=60):
         try:
-            print("Listening for insurance emails every", interval, "seconds...")
+            use_idle = "IDLE" in self.imap.capabilities
+            if use_idle:
+                print("Listening for insurance emails with IMAP IDLE...")
+            else:
+                print("Listening for insurance emails every", interval, "seconds...")
             while True:
                 self.check_inbox()
-                time.sleep(interval)
+                if use_idle:
+                    # Returns as soon as mail arrives; a timeout just triggers a routine check
+                    try:
+                        self.wait_for_mail()
+                    except CONNECTION_ERRORS:
+                        print("[WARNING] IMAP connection dropped during IDLE, reconnecting...")
+                        self.connect()
+                else:
+                    # Sleep in slices so long intervals still keep the connection alive
+                    deadline = time.monotonic() + interval
+                    while time.monotonic() < deadline:
+                        time.sleep(min(KEEPALIVE_INTERVAL, max(0, deadline - time.monotonic())))
+                        self.keepalive()
         except KeyboardInterrupt:
             print("[STOP] Stopped listening.")
-            self.imap.logout()
+            self.disconnect()
@@ -3,10 +3,97 @@
 import os
 import time
 import shutil
-import json
+import json_codec
+import errno
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Polling fallback waits this long after a change, doubling while idle up to the max
+POLL_MIN_INTERVAL = 0.05
+POLL_MAX_INTERVAL = 1.0
+
+# In-progress downloads/temp files, which are renamed to their final name when complete
+PARTIAL_FILE_SUFFIXES = (".tmp", ".part", ".crdownload")
+
+def is_partial_file(name):
+    """Return True for hidden or temporary files that are not finished uploads"""
+    return name.startswith(".") or name.endswith(PARTIAL_FILE_SUFFIXES)
+
+# ioctl request that clones file extents (Btrfs, XFS); see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+def link_or_copy(src, dst):
+    """
+    Place src at dst without copying data when the filesystem allows it.
+    
+    Tries a hardlink, then a reflink (copy-on-write clone), and only falls
+    back to a full shutil.copy2 when neither is supported.
+    """
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+
+    if fcntl is not None:
+        try:
+            with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            shutil.copystat(src, dst)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.EBADF):
+                raise
+
+    shutil.copy2(src, dst)
+
+try:
+    # inotify reports when a writer closes a file, not just when it is created
+    from watchdog.observers.inotify import InotifyObserver
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    InotifyObserver = None
+    FileSystemEventHandler = object
+
+class NewFileHandler(FileSystemEventHandler):
+    """Forwards watchdog close/move/delete events for finished files to a FileListener"""
+
+    def __init__(self, listener):
+        super().__init__()
+        self.listener = listener
+
+    def handle(self, path):
+        name = os.path.basename(path)
+        if is_partial_file(name):
+            return
+        try:
+            self.listener.handle_new_file(name)
+        except OSError as e:
+            # An exception here would kill the observer thread and silently stop watching
+            print(f"[WARNING] Could not ingest {name}: {e}")
+
+    def on_closed(self, event):
+        # IN_CLOSE_WRITE: the writer has finished, so the file is complete.
+        # Creation alone would hand over a file that may still be half written
+        if not event.is_directory:
+            self.handle(event.src_path)
+
+    def on_moved(self, event):
+        # Files renamed into the folder (e.g. after a temp-file download) count as new
+        if not event.is_directory:
+            self.handle(event.dest_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            print(f"File removed: {os.path.basename(event.src_path)}")
+
 class FileListener:
+    __slots__ = ("directory_to_watch", "data_lake_path", "ingestion_queue_path", "queue_file", "known_files", "last_mtime")
+
     def __init__(self, directory_to_watch):
         self.directory_to_watch = directory_to_watch
         self.data_lake_path = "data/lake"
@@ -16,7 +103,11 @@ class FileListener:
         os.makedirs(self.data_lake_path, exist_ok=True)
         os.makedirs(self.ingestion_queue_path, exist_ok=True)
         
-        self.files_set = set(os.listdir(directory_to_watch))
+        # Append-only JSONL queue, one request per line; line buffering flushes each request
+        self.queue_file = open(os.path.join(self.ingestion_queue_path, "requests.jsonl"), "a", buffering=1)
+        
+        self.last_mtime = os.stat(directory_to_watch).st_mtime_ns
+        self.known_files = self.scan_directory()
 
     def store_to_data_lake(self, file_path):
         """Store file to data lake and return URI"""
@@ -25,7 +116,7 @@ class FileListener:
         stored_filename = f"{timestamp}_{filename}"
         stored_path = os.path.join(self.data_lake_path, stored_filename)
         
-        shutil.copy2(file_path, stored_path)
+        link_or_copy(file_path, stored_path)
         return stored_path
 
     def send_to_ingestion_engine(self, file_uri, original_file):
@@ -38,40 +129,95 @@ class FileListener:
             "status": "pending"
         }
         
-        # Create ingestion request file
-        request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        request_file = os.path.join(self.ingestion_queue_path, f"request_{request_id}.json")
+        # Append the request to the ingestion queue
+        self.queue_file.write(json_codec.dumps(ingestion_data) + "\n")
         
-        with open(request_file, 'w') as f:
-            json.dump(ingestion_data, f, indent=2)
+        print(f"Sent to ingestion engine: {self.queue_file.name}")
+
+    def handle_new_file(self, file):
+        """Store a newly added file to the data lake and queue it for ingestion"""
+        print(f"File added: {file}")
+        file_path = os.path.join(self.directory_to_watch, file)
         
-        print(f"Sent to ingestion engine: {request_file}")
+        # Store to data lake
+        file_uri = self.store_to_data_lake(file_path)
+        print(f"Stored to data lake: {file_uri}")
+        
+        # Send to ingestion engine
+        self.send_to_ingestion_engine(file_uri, file)
 
     def watch(self):
         print(f"Watching directory: {self.directory_to_watch}")
+        if InotifyObserver is None:
+            # No inotify (non-Linux or watchdog missing), fall back to polling the directory
+            self.poll()
+            return
+
+        observer = InotifyObserver()
+        observer.schedule(NewFileHandler(self), self.directory_to_watch, recursive=False)
+        observer.start()
+        try:
+            while observer.is_alive():
+                observer.join(1)
+        except KeyboardInterrupt:
+            observer.stop()
+        observer.join()
+
+    def poll(self):
+        """Detect added and removed files by diffing directory listings, backing off while idle"""
+        interval = POLL_MIN_INTERVAL
+        # New files still being written: inode -> (size, mtime) seen on the last pass
+        pending = {}
         while True:
-            time.sleep(1)
-            current_files_set = set(os.listdir(self.directory_to_watch))
-            added_files = current_files_set - self.files_set
-            removed_files = self.files_set - current_files_set
-
-            if added_files:
-                for file in added_files:
-                    print(f"File added: {file}")
-                    file_path = os.path.join(self.directory_to_watch, file)
-                    
-                    # Store to data lake
-                    file_uri = self.store_to_data_lake(file_path)
-                    print(f"Stored to data lake: {file_uri}")
-                    
-                    # Send to ingestion engine
-                    self.send_to_ingestion_engine(file_uri, file)
-
-            if removed_files:
-                for file in removed_files:
-                    print(f"File removed: {file}")
-
-            self.files_set = current_files_set
+            time.sleep(interval)
+            # Creating, renaming or deleting an entry bumps the directory mtime,
+            # so an unchanged mtime means there is nothing to rescan
+            mtime = os.stat(self.directory_to_watch).st_mtime_ns
+            if mtime == self.last_mtime and not pending:
+                interval = min(interval * 2, POLL_MAX_INTERVAL)
+                continue
+            if mtime != self.last_mtime:
+                self.last_mtime = mtime
+                interval = POLL_MIN_INTERVAL
+
+            current_files = self.scan_directory()
+            added_inodes = current_files.keys() - self.known_files.keys()
+            removed_inodes = self.known_files.keys() - current_files.keys()
+
+            for inode in added_inodes:
+                if not is_partial_file(current_files[inode]):
+                    pending[inode] = None
+
+            # Writes don't touch the directory, so hand a file over only once its
+            # size and mtime held still for a whole poll interval
+            for inode in list(pending):
+                name = current_files.get(inode)
+                try:
+                    stat = os.stat(os.path.join(self.directory_to_watch, name)) if name else None
+                except FileNotFoundError:
+                    stat = None
+                if stat is None:
+                    del pending[inode]  # removed before it was finished
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if pending[inode] == signature:
+                    del pending[inode]
+                    try:
+                        self.handle_new_file(name)
+                    except OSError as e:
+                        print(f"[WARNING] Could not ingest {name}: {e}")
+                else:
+                    pending[inode] = signature
+
+            for inode in removed_inodes:
+                print(f"File removed: {self.known_files[inode]}")
+
+            self.known_files = current_files
+
+    def scan_directory(self):
+        """Map inode -> name for the watched directory, using scandir's cached entry data"""
+        with os.scandir(self.directory_to_watch) as entries:
+            return {entry.inode(): entry.name for entry in entries}
 
 if __name__ == "__main__":
     directory = "data/incoming"
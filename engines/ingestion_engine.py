@@ -1,6 +1,8 @@
 # Ingestion Engine for Insurance-AI Project
 
 class IngestionEngine:
+    __slots__ = ("data_source",)
+
     def __init__(self, data_source):
         self.data_source = data_source
 
@@ -0,0 +1,26 @@
+"""
+JSON encoding shared by the engines.
+
+Uses orjson (Rust, several times faster in both directions) when it is
+installed and falls back to the standard library otherwise. Both paths
+produce compact JSON text, so files and database rows stay interchangeable.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(obj):
+    """Serialize obj to a compact JSON string"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"))
+
+def loads(data):
+    """Parse JSON from a str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
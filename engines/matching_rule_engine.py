@@ -1,26 +1,119 @@
 import os
-import json
+import json_codec
+import atexit
 import time
 import sqlite3
+import threading
 from datetime import datetime
 
+from work_queue import WorkQueue
+
+try:
+    # inotify close-write/moved-to events, so a request is only read once fully written
+    from watchdog.observers.inotify import InotifyObserver
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    InotifyObserver = None
+    FileSystemEventHandler = object
+
+# Strips "$" and thousands separators from money strings in one C-level pass
+AMOUNT_CLEANUP = str.maketrans("", "", "$,")
+
+def parse_amount(value):
+    """Parse a money string such as "$1,200.50" into a float, or None if it is not a number"""
+    try:
+        return float(value.translate(AMOUNT_CLEANUP))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class ParsedSubmission:
+    """Insurance type, rule set and money fields of one submission, parsed once for all rules"""
+    __slots__ = ("insurance_type", "rules", "premium", "deductible")
+
+    def __init__(self, insurance_type, rules, premium, deductible):
+        self.insurance_type = insurance_type
+        self.rules = rules  # None if there are no rules for this insurance type
+        self.premium = premium  # None if the premium could not be parsed
+        self.deductible = deductible  # None if the deductible could not be parsed
+
+# Highest risk score (exclusive) each appetite decision tolerates, checked in this order
+APPETITE_RISK_LIMITS = (("accept", 0.3), ("review", 0.6))
+
+# Polling fallback waits this long after finding work, doubling while idle up to the max
+POLL_MIN_INTERVAL = 0.05
+POLL_MAX_INTERVAL = 2.0
+
+# Submission updates committed together; a burst of requests costs one commit per batch
+UPDATE_BATCH_SIZE = 50
+
+class RequestFileHandler(FileSystemEventHandler):
+    """Hands finished request files in the submission queue to a MatchingRuleEngine"""
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        # Serializes event handling with the startup sweep so no file is processed twice
+        self.lock = threading.Lock()
+
+    def handle(self, path):
+        with self.lock:
+            try:
+                if self.engine.is_request_file(os.path.basename(path)) and os.path.exists(path):
+                    self.engine.process_request_file(path)
+                    self.engine.flush_updates()
+            except Exception as e:
+                # An exception here would kill the observer thread and silently stop watching;
+                # the request file is kept, so the next startup sweep retries it
+                print(f"Error handling {path}: {e}")
+
+    def on_closed(self, event):
+        # IN_CLOSE_WRITE: the writer has finished with the file
+        if not event.is_directory:
+            self.handle(event.src_path)
+
+    def on_moved(self, event):
+        # IN_MOVED_TO: atomic rename into the queue
+        if not event.is_directory:
+            self.handle(event.dest_path)
+
 class MatchingRuleEngine:
     def __init__(self):
         self.submission_queue_path = "data/submission"
-        self.report_queue_path = "data/reports"
         self.db_path = "db/submission_store.db"
         
         # Create necessary directories
-        os.makedirs(self.report_queue_path, exist_ok=True)
         os.makedirs("db", exist_ok=True)
         
+        # Results for the report builder go to the shared work queue instead of per-file JSON
+        self.work_queue = WorkQueue()
+        
+        # One connection for the engine's lifetime; requests may arrive on the watcher thread
+        self.conn = self.connect_database()
+        atexit.register(self.conn.close)
+        
+        # Updates waiting for the next commit, and the request files they came from
+        self.pending_updates = []
+        self.pending_removals = []
+        
         self.init_database()
         self.load_business_rules()
 
+    def connect_database(self):
+        """Open a submission store connection with the engine's PRAGMAs applied"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # NORMAL is durable under WAL except on power loss, and skips the fsync on every commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-8000")  # 8 MB page cache
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
     def init_database(self):
         """Initialize or update submission store database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
+        
+        # WAL lets the report builder read while rules are written; the mode persists in the file
+        cursor.execute("PRAGMA journal_mode=WAL")
         
         # Add scorecard and appetite columns if they don't exist
         cursor.execute("PRAGMA table_info(submission_data)")
@@ -33,8 +126,10 @@ class MatchingRuleEngine:
         if 'risk_score' not in columns:
             cursor.execute('ALTER TABLE submission_data ADD COLUMN risk_score REAL')
         
-        conn.commit()
-        conn.close()
+        # Result updates look rows up by submission_id; without an index each one scans the table
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_submission_data_submission_id ON submission_data(submission_id)')
+        
+        self.conn.commit()
 
     def load_business_rules(self):
         """Load business rules for insurance processing"""
@@ -64,43 +159,62 @@ class MatchingRuleEngine:
                 }
             }
         }
-
-    def evaluate_risk_score(self, extracted_data, document_type):
-        """Calculate risk score based on extracted data"""
-        risk_score = 0.0
-        scorecard = {}
         
-        # Determine insurance type
+        # Flatten the appetite rules into (decision, max_premium, min_deductible, max_risk)
+        # rows once, so each decision is a tuple scan instead of nested dict lookups
+        self.appetite_tables = {
+            insurance_type: tuple(
+                (decision,
+                 rules["appetite_rules"][decision]["max_premium"],
+                 rules["appetite_rules"][decision]["min_deductible"],
+                 max_risk)
+                for decision, max_risk in APPETITE_RISK_LIMITS
+            )
+            for insurance_type, rules in self.insurance_rules.items()
+        }
+
+    def parse_submission(self, extracted_data):
+        """Derive the insurance type, its rules, premium and deductible from extracted data"""
         coverage_type = extracted_data.get("coverage_type", "").lower()
         insurance_type = "auto_insurance" if "auto" in coverage_type else "home_insurance"
         
-        if insurance_type not in self.insurance_rules:
+        return ParsedSubmission(
+            insurance_type,
+            self.insurance_rules.get(insurance_type),
+            parse_amount(extracted_data.get("premium", "0")),
+            parse_amount(extracted_data.get("deductible", "0"))
+        )
+
+    def evaluate_risk_score(self, parsed):
+        """Calculate risk score based on a parsed submission"""
+        risk_score = 0.0
+        scorecard = {}
+        
+        if parsed.rules is None:
             return risk_score, scorecard
         
-        rules = self.insurance_rules[insurance_type]["risk_factors"]
+        rules = parsed.rules["risk_factors"]
         
         # Check premium risk
-        premium_str = extracted_data.get("premium", "0")
-        try:
-            premium = float(premium_str.replace(",", "").replace("$", ""))
+        premium = parsed.premium
+        if premium is not None:
             if premium > rules["high_premium"]["threshold"]:
                 risk_score += rules["high_premium"]["weight"]
                 scorecard["high_premium"] = True
             else:
                 scorecard["high_premium"] = False
-        except:
+        else:
             premium = 0
         
         # Check deductible risk
-        deductible_str = extracted_data.get("deductible", "0")
-        try:
-            deductible = float(deductible_str.replace(",", "").replace("$", ""))
+        deductible = parsed.deductible
+        if deductible is not None:
             if deductible < rules["low_deductible"]["threshold"]:
                 risk_score += rules["low_deductible"]["weight"]
                 scorecard["low_deductible"] = True
             else:
                 scorecard["low_deductible"] = False
-        except:
+        else:
             deductible = 0
         
         # New policy factor
@@ -111,50 +225,65 @@ class MatchingRuleEngine:
         
         return risk_score, scorecard
 
-    def determine_appetite(self, extracted_data, risk_score):
+    def determine_appetite(self, parsed, risk_score):
         """Determine appetite decision based on rules"""
-        coverage_type = extracted_data.get("coverage_type", "").lower()
-        insurance_type = "auto_insurance" if "auto" in coverage_type else "home_insurance"
-        
-        if insurance_type not in self.insurance_rules:
+        if parsed.rules is None:
             return "review", "Unknown insurance type"
         
-        rules = self.insurance_rules[insurance_type]["appetite_rules"]
-        
-        # Extract premium and deductible
-        try:
-            premium = float(extracted_data.get("premium", "0").replace(",", "").replace("$", ""))
-            deductible = float(extracted_data.get("deductible", "0").replace(",", "").replace("$", ""))
-        except:
+        if parsed.premium is None or parsed.deductible is None:
             return "review", "Invalid premium or deductible data"
+        premium = parsed.premium
+        deductible = parsed.deductible
+        reason = f"Premium: ${premium}, Deductible: ${deductible}, Risk Score: {risk_score:.2f}"
         
-        # Apply appetite rules
-        if (premium <= rules["accept"]["max_premium"] and 
-            deductible >= rules["accept"]["min_deductible"] and 
-            risk_score < 0.3):
-            return "accept", f"Premium: ${premium}, Deductible: ${deductible}, Risk Score: {risk_score:.2f}"
-        
-        elif (premium <= rules["review"]["max_premium"] and 
-              deductible >= rules["review"]["min_deductible"] and 
-              risk_score < 0.6):
-            return "review", f"Premium: ${premium}, Deductible: ${deductible}, Risk Score: {risk_score:.2f}"
+        # Apply appetite rules; the first row the submission satisfies wins
+        for decision, max_premium, min_deductible, max_risk in self.appetite_tables[parsed.insurance_type]:
+            if premium <= max_premium and deductible >= min_deductible and risk_score < max_risk:
+                return decision, reason
         
-        else:
-            return "decline", f"Premium: ${premium}, Deductible: ${deductible}, Risk Score: {risk_score:.2f}"
+        return "decline", reason
 
     def update_submission_with_results(self, submission_id, scorecard_data, appetite_data, risk_score):
-        """Update submission record with scorecard and appetite results"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE submission_data 
-            SET scorecard_data = ?, appetite_data = ?, risk_score = ?, status = ?
-            WHERE submission_id = ?
-        ''', (json.dumps(scorecard_data), json.dumps(appetite_data), risk_score, 'processed', submission_id))
+        """Queue a submission update; it is written by the next flush_updates call"""
+        self.pending_updates.append(
+            (json_codec.dumps(scorecard_data), json_codec.dumps(appetite_data), risk_score, 'processed', submission_id)
+        )
+        if len(self.pending_updates) >= UPDATE_BATCH_SIZE:
+            self.flush_updates()
+
+    def flush_updates(self):
+        """Commit queued submission updates, then queued reports, then drop their request files"""
+        # The work queue is a separate database (db/queue.db), so the two commits are not
+        # atomic. Submission updates go first because re-running them is harmless; reports
+        # are only published once those are stored, and request files are only removed
+        # once both are. A crash after the queue commit but before the removals means the
+        # request is reprocessed on restart and its report is queued a second time.
+        try:
+            if self.pending_updates:
+                self.conn.executemany('''
+                    UPDATE submission_data 
+                    SET scorecard_data = ?, appetite_data = ?, risk_score = ?, status = ?
+                    WHERE submission_id = ?
+                ''', self.pending_updates)
+                self.conn.commit()
+            self.work_queue.commit()
+        except Exception:
+            # Drop the uncommitted reports too, so a later commit can't publish them for
+            # requests that are kept and processed again
+            self.conn.rollback()
+            self.work_queue.rollback()
+            self.pending_removals.clear()
+            raise
+        finally:
+            self.pending_updates.clear()
         
-        conn.commit()
-        conn.close()
+        # Requests are only removed once their results are committed
+        for request_file in self.pending_removals:
+            try:
+                os.remove(request_file)
+            except FileNotFoundError:
+                pass
+        self.pending_removals.clear()
 
     def send_to_report_builder(self, submission_id, processing_id, document_type, extracted_data, scorecard_data, appetite_data):
         """Send processed data to report builder"""
@@ -170,67 +299,114 @@ class MatchingRuleEngine:
             "status": "pending"
         }
         
-        request_file = os.path.join(self.report_queue_path, f"processed_{submission_id}.json")
-        
-        with open(request_file, 'w') as f:
-            json.dump(report_data, f, indent=2)
+        # Published by flush_updates after the submission updates are committed
+        self.work_queue.push("report", report_data)
         
-        print(f"Sent to report builder: {request_file}")
+        print(f"Queued for report builder: {submission_id}")
+
+    def is_request_file(self, filename):
+        """Check if a filename is a matching request from the data extraction engine"""
+        return filename.startswith("extracted_") and filename.endswith(".json")
+
+    def process_request_file(self, request_file):
+        """Apply business rules to one matching request and forward the result; True if it was processed"""
+        try:
+            with open(request_file, 'rb') as f:
+                request_data = json_codec.loads(f.read())
+            
+            submission_id = request_data.get("submission_id", "unknown")
+            processing_id = request_data.get("processing_id", "unknown")
+            document_type = request_data.get("document_type", "unknown")
+            extracted_data = request_data.get("extracted_data", {})
+            
+            if extracted_data:
+                print(f"Processing rules for: {submission_id}")
+                
+                # Parse once, shared by the risk and appetite rules
+                parsed = self.parse_submission(extracted_data)
+                
+                # Calculate risk score and scorecard
+                risk_score, scorecard = self.evaluate_risk_score(parsed)
+                
+                # Determine appetite
+                appetite_decision, appetite_reason = self.determine_appetite(parsed, risk_score)
+                
+                appetite_data = {
+                    "decision": appetite_decision,
+                    "reason": appetite_reason,
+                    "risk_score": risk_score
+                }
+                
+                # Update submission record
+                self.update_submission_with_results(submission_id, scorecard, appetite_data, risk_score)
+                
+                # Send to report builder
+                self.send_to_report_builder(submission_id, processing_id, document_type, 
+                                          extracted_data, scorecard, appetite_data)
+                
+                print(f"Rules processing completed: {submission_id}")
+                print(f"Risk Score: {risk_score:.2f}, Decision: {appetite_decision}")
+                print(f"Scorecard: {scorecard}")
+                
+                # Remove processed request once its update is committed
+                self.pending_removals.append(request_file)
+                return True
+            
+        except Exception as e:
+            print(f"Error processing {request_file}: {e}")
+        return False
+
+    def process_pending_requests(self):
+        """Process every matching request currently in the submission queue; returns how many succeeded"""
+        processed = 0
+        if os.path.exists(self.submission_queue_path):
+            # scandir entries carry the full path and file type without extra stat calls
+            with os.scandir(self.submission_queue_path) as entries:
+                for entry in entries:
+                    if self.is_request_file(entry.name) and entry.is_file():
+                        processed += self.process_request_file(entry.path)
+            self.flush_updates()
+        return processed
 
     def process_matching_requests(self):
         """Process matching requests from data extraction engine"""
         print("Matching/Rule Engine started - Monitoring for requests...")
         
+        if InotifyObserver is None:
+            # No inotify (non-Linux or watchdog missing), fall back to polling
+            self.poll_matching_requests()
+            return
+        
+        os.makedirs(self.submission_queue_path, exist_ok=True)
+        handler = RequestFileHandler(self)
+        observer = InotifyObserver()
+        observer.schedule(handler, self.submission_queue_path, recursive=False)
+        observer.start()
+        
+        # Requests written before the watch started never produce an event
+        with handler.lock:
+            self.process_pending_requests()
+        
+        try:
+            while observer.is_alive():
+                observer.join(1)
+        except KeyboardInterrupt:
+            print("Matching/Rule Engine stopped")
+            observer.stop()
+        observer.join()
+
+    def poll_matching_requests(self):
+        """Check the submission queue for new requests, backing off from 50ms to 2s while idle"""
+        interval = POLL_MIN_INTERVAL
         while True:
             try:
-                # Check for new matching requests
-                if os.path.exists(self.submission_queue_path):
-                    for filename in os.listdir(self.submission_queue_path):
-                        if filename.startswith("extracted_") and filename.endswith(".json"):
-                            request_file = os.path.join(self.submission_queue_path, filename)
-                            
-                            try:
-                                with open(request_file, 'r') as f:
-                                    request_data = json.load(f)
-                                
-                                submission_id = request_data.get("submission_id", "unknown")
-                                processing_id = request_data.get("processing_id", "unknown")
-                                document_type = request_data.get("document_type", "unknown")
-                                extracted_data = request_data.get("extracted_data", {})
-                                
-                                if extracted_data:
-                                    print(f"Processing rules for: {submission_id}")
-                                    
-                                    # Calculate risk score and scorecard
-                                    risk_score, scorecard = self.evaluate_risk_score(extracted_data, document_type)
-                                    
-                                    # Determine appetite
-                                    appetite_decision, appetite_reason = self.determine_appetite(extracted_data, risk_score)
-                                    
-                                    appetite_data = {
-                                        "decision": appetite_decision,
-                                        "reason": appetite_reason,
-                                        "risk_score": risk_score
-                                    }
-                                    
-                                    # Update submission record
-                                    self.update_submission_with_results(submission_id, scorecard, appetite_data, risk_score)
-                                    
-                                    # Send to report builder
-                                    self.send_to_report_builder(submission_id, processing_id, document_type, 
-                                                              extracted_data, scorecard, appetite_data)
-                                    
-                                    print(f"Rules processing completed: {submission_id}")
-                                    print(f"Risk Score: {risk_score:.2f}, Decision: {appetite_decision}")
-                                    print(f"Scorecard: {scorecard}")
-                                    
-                                    # Remove processed request
-                                    os.remove(request_file)
-                                
-                            except Exception as e:
-                                print(f"Error processing {request_file}: {e}")
+                # Check for new matching requests; bursts are picked up quickly, idle queues cost little
+                if self.process_pending_requests():
+                    interval = POLL_MIN_INTERVAL
+                else:
+                    interval = min(interval * 2, POLL_MAX_INTERVAL)
                 
-                time.sleep(2)  # Check every 2 seconds
+                time.sleep(interval)
                 
             except KeyboardInterrupt:
                 print("Matching/Rule Engine stopped")
@@ -1,6 +1,7 @@
 # notification_engine.py
 
 import smtplib
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
@@ -10,6 +11,36 @@ class NotificationEngine:
         self.smtp_port = smtp_port
         self.username = username
         self.password = password
+        # Logged-in connection reused across emails; opened on first send
+        self.server = None
+        # One worker keeps the SMTP connection single-threaded and notifications in order
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def get_server(self):
+        """Return the open SMTP connection, reconnecting if the server dropped it"""
+        if self.server is not None:
+            try:
+                # Cheap liveness check; servers close idle sessions after a few minutes
+                if self.server.noop()[0] == 250:
+                    return self.server
+            except smtplib.SMTPException:
+                pass
+            self.close()
+
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        server.starttls()
+        server.login(self.username, self.password)
+        self.server = server
+        return server
+
+    def close(self):
+        """Close the SMTP connection if one is open"""
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except smtplib.SMTPException:
+                pass
+            self.server = None
 
     def send_email(self, to_email, subject, message):
         msg = MIMEMultipart()
@@ -20,17 +51,20 @@ class NotificationEngine:
         msg.attach(MIMEText(message, 'plain'))
 
         try:
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.username, self.password)
-                server.send_message(msg)
+            try:
+                self.get_server().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # Dropped between the liveness check and the send; retry once on a new session
+                self.close()
+                self.get_server().send_message(msg)
             print(f"Email sent to {to_email}")
         except Exception as e:
             print(f"Failed to send email: {e}")
 
     def notify(self, event_type, details):
+        """Queue a notification email; returns a future instead of blocking on SMTP"""
         subject = f"Notification: {event_type}"
         message = f"Details: {details}"
         # Example recipient, this could be dynamic based on the event
         recipient = "recipient@example.com"
-        self.send_email(recipient, subject, message)
\ No newline at end of file
+        return self.executor.submit(self.send_email, recipient, subject, message)
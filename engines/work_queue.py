@@ -0,0 +1,79 @@
+import os
+import json_codec
+import sqlite3
+from datetime import datetime
+
+class WorkQueue:
+    """SQLite-backed hand-off queue between engines, one row per work item"""
+    __slots__ = ("db_path", "conn")
+
+    def __init__(self, db_path="db/queue.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        # Producers and consumers run in different processes; WAL lets them overlap
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.init_database()
+
+    def init_database(self):
+        """Create the work queue table and its lookup index"""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS work_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                stage TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_stage_status ON work_queue(stage, status)')
+        self.conn.commit()
+
+    def push(self, stage, payload):
+        """Queue a payload for a stage; it becomes visible to consumers on commit()"""
+        self.conn.execute(
+            'INSERT INTO work_queue (stage, payload, created_at) VALUES (?, ?, ?)',
+            (stage, json_codec.dumps(payload), datetime.now().isoformat())
+        )
+
+    def commit(self):
+        """Commit every pushed item in one transaction"""
+        self.conn.commit()
+
+    def rollback(self):
+        """Discard every item pushed since the last commit"""
+        self.conn.rollback()
+
+    def claim(self, stage, limit=64):
+        """Atomically take up to limit pending items for a stage, oldest first"""
+        if self.conn.in_transaction:
+            self.conn.commit()
+
+        # IMMEDIATE takes the write lock up front, so two consumers never claim the same rows
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                "SELECT id, payload FROM work_queue WHERE stage = ? AND status = 'pending' ORDER BY id LIMIT ?",
+                (stage, limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE work_queue SET status = 'taken' WHERE id = ?",
+                [(row[0],) for row in rows]
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        return [(item_id, json_codec.loads(payload)) for item_id, payload in rows]
+
+    def complete(self, item_ids):
+        """Mark claimed items as done"""
+        self.conn.executemany(
+            "UPDATE work_queue SET status = 'done' WHERE id = ?",
+            [(item_id,) for item_id in item_ids]
+        )
+        self.conn.commit()
@@ -20,23 +20,72 @@ The system automatically:
 import os
 import sys
 import time
-import pandas as pd
-from datetime import datetime, timedelta
+import threading
+import multiprocessing
+from datetime import datetime
 import json
+import csv
+import io
 from pathlib import Path
 import email
+from email.parser import BytesHeaderParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Add the paths for importing our custom modules
-# This allows us to import from subdirectories
-sys.path.append(os.path.join(os.path.dirname(__file__), 'engines'))
-sys.path.append(os.path.join(os.path.dirname(__file__), 'invoice_reader'))
+# This allows us to import from subdirectories; skip paths that are already
+# present so repeated imports (e.g. Streamlit reruns) don't grow sys.path
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+for module_dir in (os.path.join(BASE_DIR, 'engines'), os.path.join(BASE_DIR, 'invoice_reader')):
+    if module_dir not in sys.path:
+        sys.path.append(module_dir)
 
 # Import our custom modules for different functionalities
-from engines.email_listener import EmailListener  # Handles Gmail IMAP connection
-from engines.drive_uploader import create_drive_folder, upload_file, authenticate_drive  # Google Drive operations
-from invoice_reader.backend import get_pdf_text_with_ocr, process_image, extracted_data, create_docs  # Invoice processing
+from engines.email_listener import EmailListener, CONNECTION_ERRORS, KEEPALIVE_INTERVAL, search_since  # Handles Gmail IMAP connection
+from engines.drive_uploader import create_drive_folder, upload_files_concurrently, authenticate_drive, get_thread_http  # Google Drive operations
+from invoice_reader.backend import extract_file_rows, init_ocr_worker, INVOICE_COLUMNS, MIME_TYPES  # Invoice processing
 from invoice_reader.logging_config import logger  # Logging configuration
 
+# Attachments OCR'd in parallel; each worker process loads its own EasyOCR model,
+# so the count is capped to keep memory in check on many-core machines
+OCR_WORKERS = min(4, os.cpu_count() or 1)
+
+# Worker processes are kept between emails so the OCR model loads once per worker
+_ocr_pool = None
+
+def get_ocr_pool():
+    """Return the shared OCR process pool, starting it on first use."""
+    global _ocr_pool
+    if _ocr_pool is None:
+        # Spawn rather than fork: this process already runs Streamlit, executor and
+        # torch threads, and forking a multithreaded process can deadlock the child.
+        # Each fresh worker loads its own model in the initializer
+        _ocr_pool = ProcessPoolExecutor(
+            max_workers=OCR_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_ocr_worker
+        )
+    return _ocr_pool
+
+def reset_ocr_pool():
+    """Discard a broken OCR pool so the next call to get_ocr_pool starts a fresh one."""
+    global _ocr_pool
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown(wait=False, cancel_futures=True)
+        _ocr_pool = None
+
+# Attachment extensions the invoice reader can process
+INVOICE_EXTENSIONS = frozenset(MIME_TYPES)
+
+def find_invoice_files(attachments_dir):
+    """Return the PDF and image files in a directory as a list of paths."""
+    # One scandir pass; DirEntry.is_file() reuses the type from the directory listing
+    with os.scandir(attachments_dir) as entries:
+        return [
+            entry.path for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in INVOICE_EXTENSIONS
+        ]
+
 class IntegratedEmailInvoiceProcessor:
     """
     Main processor class that orchestrates the entire email-to-invoice pipeline.
@@ -63,25 +112,37 @@ class IntegratedEmailInvoiceProcessor:
         self.email_listener = EmailListener(email_address, app_password)
         # List to store all processed invoice results
         self.processed_invoices = []
+        # imaplib is not thread-safe; held while a check uses the connection, since the
+        # dashboard shares one processor across its worker threads and browser sessions
+        self.lock = threading.Lock()
         
     def connect(self):
         """
         Connect to the Gmail server using IMAP protocol.
         This must be called before any email operations.
+        
+        An already open connection is kept and only NOOP-checked, so repeated
+        calls don't pay for a new TLS handshake and LOGIN.
         """
+        if self.email_listener.imap is not None:
+            # Reconnects on its own if the NOOP shows the connection is gone
+            self.email_listener.keepalive()
+            return
         logger.info("Connecting to email server...")
         self.email_listener.connect()
         logger.info("Successfully connected to email server")
     
-    def process_invoice_attachments(self, attachments_dir):
+    def process_invoice_attachments(self, attachments_dir, attachment_files=None):
         """
         Process PDF and image attachments to extract invoice data.
         
         Args:
             attachments_dir (str): Path to directory containing downloaded attachments
+            attachment_files (list): Invoice file paths already found in attachments_dir;
+                the directory is scanned when omitted
             
         Returns:
-            pandas.DataFrame or None: Extracted invoice data or None if processing failed
+            list or None: Extracted invoice rows as dicts keyed by INVOICE_COLUMNS, or None if processing failed
         """
         # Validate that attachments directory exists
         if not attachments_dir or not os.path.exists(attachments_dir):
@@ -89,12 +150,8 @@ class IntegratedEmailInvoiceProcessor:
             return None
         
         # Find all PDF and image files in the attachments directory
-        attachment_files = []
-        for file in os.listdir(attachments_dir):
-            file_path = os.path.join(attachments_dir, file)
-            # Check for supported file extensions
-            if file.lower().endswith(('.pdf', '.jpg', '.jpeg', '.png')):
-                attachment_files.append(file_path)
+        if attachment_files is None:
+            attachment_files = find_invoice_files(attachments_dir)
         
         # Check if we found any processable files
         if not attachment_files:
@@ -103,78 +160,33 @@ class IntegratedEmailInvoiceProcessor:
         
         logger.info(f"Found {len(attachment_files)} invoice files to process")
         
-        # Create mock file objects that are compatible with the invoice reader
-        mock_files = []
-        for file_path in attachment_files:
-            mock_file = self.create_mock_file(file_path)
-            if mock_file:
-                mock_files.append(mock_file)
-        
-        # Ensure we have valid files to process
-        if not mock_files:
-            logger.warning("No valid files could be processed")
-            return None
-        
-        # Process files using the invoice reader backend
+        # OCR is CPU-bound, so attachments are extracted in parallel worker processes;
+        # a single file runs inline rather than paying for a worker hand-off
         logger.info("Processing invoice files...")
-        df = create_docs(mock_files)
+        if len(attachment_files) == 1:
+            file_rows = [extract_file_rows(attachment_files[0])]
+        else:
+            try:
+                file_rows = list(get_ocr_pool().map(extract_file_rows, attachment_files))
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory); drop the pool and finish serially
+                logger.warning(f"OCR worker pool failed, processing files serially: {e}")
+                reset_ocr_pool()
+                file_rows = [extract_file_rows(path) for path in attachment_files]
+        
+        # Plain row dicts feed both the CSV upload and the result payload; no DataFrame needed
+        rows = [row for file_row_list in file_rows for row in file_row_list]
         
         # Return results if successful
-        if not df.empty:
-            logger.info(f"Successfully extracted data from {len(df)} invoice items")
-            return df
+        if rows:
+            logger.info(f"Successfully extracted data from {len(rows)} invoice items")
+            return rows
         else:
             logger.warning("No data could be extracted from invoice files")
             return None
     
-    def create_mock_file(self, file_path):
-        """
-        Create a mock file object that mimics uploaded files for the invoice reader.
-        
-        The invoice reader expects file objects with specific attributes,
-        so we create a mock object that provides the necessary interface.
-        
-        Args:
-            file_path (str): Path to the actual file on disk
-            
-        Returns:
-            MockFile object or None: Mock file object or None if creation failed
-        """
-        try:
-            class MockFile:
-                """
-                Mock file object that mimics the interface expected by invoice reader.
-                """
-                def __init__(self, filepath):
-                    # Store file information
-                    self.name = os.path.basename(filepath)
-                    self.file_path = filepath
-                    
-                    # Determine MIME type based on file extension
-                    if filepath.lower().endswith('.pdf'):
-                        self.type = 'application/pdf'
-                    elif filepath.lower().endswith(('.jpg', '.jpeg')):
-                        self.type = 'image/jpeg'
-                    elif filepath.lower().endswith('.png'):
-                        self.type = 'image/png'
-                    else:
-                        self.type = 'application/octet-stream'
-                        
-                def read(self):
-                    """
-                    Read the file contents as bytes.
-                    This method is expected by the invoice reader.
-                    """
-                    with open(self.file_path, 'rb') as f:
-                        return f.read()
-            
-            return MockFile(file_path)
-        except Exception as e:
-            logger.error(f"Error creating mock file for {file_path}: {e}")
-            return None
-    
-    def save_to_google_drive(self, invoice_data, email_metadata, attachments_dir):
-        """Save invoice data, CSV, and files to Google Drive"""
+    def save_to_google_drive(self, invoice_data, email_metadata, attachments_dir, attachment_files=None):
+        """Save invoice data, CSV, and files to Google Drive; attachment_files skips rescanning attachments_dir"""
         try:
             # Create Google Drive service
             service = authenticate_drive()
@@ -184,7 +196,8 @@ class IntegratedEmailInvoiceProcessor:
             folder_name = f"Invoice_Processing_{timestamp}"
             
             logger.info(f"Creating Google Drive folder: {folder_name}")
-            folder_id = create_drive_folder(service, folder_name)
+            # Runs on dashboard worker threads, so use this thread's connection, not the shared one
+            folder_id = create_drive_folder(service, folder_name, http=get_thread_http())
             
             if not folder_id:
                 logger.error("Failed to create Google Drive folder")
@@ -193,59 +206,49 @@ class IntegratedEmailInvoiceProcessor:
             drive_link = f"https://drive.google.com/drive/folders/{folder_id}"
             logger.info(f"Created folder: {drive_link}")
             
-            uploaded_files = []
+            # Files to upload as (path or bytes, name, type); all of them go up concurrently
+            uploads = []
             
-            # 1. Save invoice data as CSV (temporarily for upload, then delete)
-            if invoice_data is not None and not invoice_data.empty:
+            # 1. Invoice data as CSV, serialized in memory instead of via a temporary file
+            if invoice_data:
                 csv_filename = f"invoice_data_{timestamp}.csv"
-                csv_path = os.path.join(attachments_dir, csv_filename)
-                invoice_data.to_csv(csv_path, index=False)
-                
-                csv_file_id = upload_file(service, csv_path, csv_filename, folder_id)
-                if csv_file_id:
-                    uploaded_files.append({"name": csv_filename, "id": csv_file_id, "type": "CSV"})
-                    logger.info(f"Uploaded CSV: {csv_filename}")
-                    # Delete local CSV file after successful upload
-                    try:
-                        os.remove(csv_path)
-                        logger.info(f"Deleted local CSV file: {csv_filename}")
-                    except Exception as e:
-                        logger.warning(f"Could not delete local CSV: {e}")
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=INVOICE_COLUMNS, lineterminator='\n')
+                writer.writeheader()
+                writer.writerows(invoice_data)
+                uploads.append((buffer.getvalue().encode('utf-8'), csv_filename, "CSV"))
             
-            # 2. Save email metadata as JSON (temporarily for upload, then delete)
+            # 2. Email metadata as JSON, also straight from memory
             metadata_filename = f"email_metadata_{timestamp}.json"
-            metadata_path = os.path.join(attachments_dir, metadata_filename)
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(email_metadata, f, indent=2, ensure_ascii=False)
+            metadata_bytes = json.dumps(email_metadata, indent=2, ensure_ascii=False).encode('utf-8')
+            uploads.append((metadata_bytes, metadata_filename, "Metadata"))
+            
+            # 3. Original PDF/image attachments
+            if attachment_files is None and attachments_dir and os.path.exists(attachments_dir):
+                attachment_files = find_invoice_files(attachments_dir)
+            for file_path in attachment_files or ():
+                uploads.append((file_path, os.path.basename(file_path), "Original"))
+            
+            # Upload everything in parallel; an error leaves every local file in place as a fallback
+            file_ids = upload_files_concurrently(service, [(source, name) for source, name, _ in uploads], folder_id)
             
-            metadata_file_id = upload_file(service, metadata_path, metadata_filename, folder_id)
-            if metadata_file_id:
-                uploaded_files.append({"name": metadata_filename, "id": metadata_file_id, "type": "Metadata"})
-                logger.info(f"Uploaded metadata: {metadata_filename}")
-                # Delete local metadata file after successful upload
+            uploaded_files = []
+            for (source, file, file_type), file_id in zip(uploads, file_ids):
+                if not file_id:
+                    continue
+                uploaded_files.append({"name": file, "id": file_id, "type": file_type})
+                logger.info(f"Uploaded {file_type} file: {file}")
+                if isinstance(source, bytes):
+                    continue
+                # Delete local file after successful upload
                 try:
-                    os.remove(metadata_path)
-                    logger.info(f"Deleted local metadata file: {metadata_filename}")
+                    os.remove(source)
+                    logger.info(f"Deleted local file: {file}")
                 except Exception as e:
-                    logger.warning(f"Could not delete local metadata: {e}")
+                    logger.warning(f"Could not delete local file {file}: {e}")
             
-            # 3. Upload original PDF/image attachments and delete after upload
+            # Try to remove the empty attachments directory
             if attachments_dir and os.path.exists(attachments_dir):
-                for file in os.listdir(attachments_dir):
-                    file_path = os.path.join(attachments_dir, file)
-                    if os.path.isfile(file_path) and file.lower().endswith(('.pdf', '.jpg', '.jpeg', '.png')):
-                        file_id = upload_file(service, file_path, file, folder_id)
-                        if file_id:
-                            uploaded_files.append({"name": file, "id": file_id, "type": "Original"})
-                            logger.info(f"Uploaded original file: {file}")
-                            # Delete local file after successful upload
-                            try:
-                                os.remove(file_path)
-                                logger.info(f"Deleted local file: {file}")
-                            except Exception as e:
-                                logger.warning(f"Could not delete local file {file}: {e}")
-                
-                # Try to remove the empty attachments directory
                 try:
                     if not os.listdir(attachments_dir):  # Only if empty
                         os.rmdir(attachments_dir)
@@ -267,16 +270,13 @@ class IntegratedEmailInvoiceProcessor:
     def process_single_email(self, uid, msg):
         """Process a single email with invoice attachments"""
         try:
-            # Extract email data
-            to, cc, subject, body = self.email_listener.extract_email_data(msg)
+            # Extract email data and save attachments in one pass over the message
+            to, cc, subject, body, attachments_dir = self.email_listener.process_message(msg, uid)
             from_ = msg.get("From")
             date_ = msg.get("Date")
             
             logger.info(f"Processing email: {subject}")
             
-            # Save attachments
-            attachments_dir = self.email_listener.save_attachments(msg)
-            
             if not attachments_dir:
                 logger.warning("No attachments found in email")
                 return None
@@ -288,20 +288,24 @@ class IntegratedEmailInvoiceProcessor:
                 "cc": cc,
                 "subject": subject,
                 "date": date_,
+                "message_id": msg.get("Message-ID"),
                 "body": body,
                 "processed_at": datetime.now().isoformat()
             }
             
+            # Scan the attachments once for both OCR and upload
+            attachment_files = find_invoice_files(attachments_dir) if os.path.isdir(attachments_dir) else []
+            
             # Process invoice attachments
-            invoice_data = self.process_invoice_attachments(attachments_dir)
+            invoice_data = self.process_invoice_attachments(attachments_dir, attachment_files)
             
             # Save everything to Google Drive
-            drive_result = self.save_to_google_drive(invoice_data, email_metadata, attachments_dir)
+            drive_result = self.save_to_google_drive(invoice_data, email_metadata, attachments_dir, attachment_files)
             
             if drive_result:
                 result = {
                     "email_metadata": email_metadata,
-                    "invoice_data": invoice_data.to_dict('records') if invoice_data is not None else [],
+                    "invoice_data": invoice_data or [],
                     "drive_link": drive_result["drive_link"],
                     "uploaded_files": drive_result["uploaded_files"],
                     "processed_at": datetime.now().isoformat()
@@ -324,61 +328,74 @@ class IntegratedEmailInvoiceProcessor:
         self.email_listener.seen_uids.clear()
         logger.info("Reset seen emails cache")
     
-    def check_and_process_emails(self, force_reprocess=False):
-        """Check for new emails and process them"""
-        try:
-            if force_reprocess:
-                self.reset_seen_emails()
+    def check_and_process_emails(self, force_reprocess=False, batch_size=50):
+        """Check for new emails and process them, fetching up to batch_size emails per IMAP round trip"""
+        with self.lock:
+            try:
+                if force_reprocess:
+                    self.reset_seen_emails()
                 
-            date_since = (datetime.now() - timedelta(days=3)).strftime("%d-%b-%Y")
-            # Only get UNREAD emails from the last 3 days, unless forcing reprocess
-            if force_reprocess:
-                status, messages = self.email_listener.imap.uid("search", None, f'(SINCE {date_since})')
-                logger.info("Force reprocess: checking all emails from last 3 days")
-            else:
-                status, messages = self.email_listener.imap.uid("search", None, f'(UNSEEN SINCE {date_since})')
-                logger.info("Normal check: only looking for unread emails")
+                date_since = search_since()
+                # Only get UNREAD emails from the last 3 days, unless forcing reprocess.
+                # Servers with substring SUBJECT search also prefilter on the insurance
+                # keywords; Gmail matches whole words, so there the header screen below decides
+                if force_reprocess:
+                    criteria = self.email_listener.insurance_search(f"SINCE {date_since}")
+                    status, messages = self.email_listener.safe_uid("search", None, f'({criteria})')
+                    logger.info("Force reprocess: checking all emails from last 3 days")
+                    new_uids = messages[0].split() if status == "OK" else None
+                else:
+                    # Skips everything at or below the persisted highest UID
+                    new_uids = self.email_listener.search_new_uids(
+                        self.email_listener.insurance_search(f"UNSEEN SINCE {date_since}")
+                    )
+                    logger.info("Normal check: only looking for unread emails")
 
-            if status != "OK":
-                logger.warning("Failed to fetch messages")
-                return []
+                if new_uids is None:
+                    logger.warning("Failed to fetch messages")
+                    return []
 
-            email_count = len(messages[0].split()) if messages[0] else 0
-            logger.info(f"Found {email_count} emails to check")
-            processed_results = []
-            
-            for uid in messages[0].split():
-                if uid in self.email_listener.seen_uids:
-                    logger.debug(f"Skipping already processed email UID: {uid}")
-                    continue
+                logger.info(f"Found {len(new_uids)} emails to check")
+                processed_results = []
 
-                self.email_listener.seen_uids.add(uid)
-                _, msg_data = self.email_listener.imap.uid("fetch", uid, "(RFC822)")
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
+                self.email_listener.seen_uids.update(new_uids)
 
-                if not self.email_listener.is_insurance_email(msg):
-                    logger.debug(f"Skipping non-insurance email: {msg.get('Subject', 'No Subject')}")
-                    continue  # Skip non-insurance emails
+                # Screen on a batched header-only FETCH so non-insurance mail never downloads its body;
+                # this is the authoritative keyword match, the server prefilter is only an optimization
+                insurance_uids = []
+                for uid, raw_headers in self.email_listener.fetch_headers(new_uids):
+                    headers = BytesHeaderParser().parsebytes(raw_headers)
+                    if not self.email_listener.is_insurance_email(headers):
+                        logger.debug(f"Skipping non-insurance email: {headers.get('Subject', 'No Subject')}")
+                        continue  # Skip non-insurance emails
+                    insurance_uids.append(uid)
 
-                logger.info("Found insurance email, processing...")
-                result = self.process_single_email(uid, msg)
+                # BODY.PEEK[] leaves \Seen alone; the persisted highest UID is what prevents reprocessing
+                for uid, raw_email in self.email_listener.fetch_messages(insurance_uids, batch_size, "(BODY.PEEK[])"):
+                    msg = email.message_from_bytes(raw_email)
+                    logger.info("Found insurance email, processing...")
+                    result = self.process_single_email(uid, msg)
                 
-                if result:
-                    processed_results.append(result)
+                    if result:
+                        processed_results.append(result)
             
-            logger.info(f"Processed {len(processed_results)} insurance emails")
-            return processed_results
+                self.email_listener.advance_highest_uid(new_uids)
+                logger.info(f"Processed {len(processed_results)} insurance emails")
+                return processed_results
             
-        except Exception as e:
-            logger.error(f"Error checking emails: {e}")
-            return []
+            except Exception as e:
+                logger.error(f"Error checking emails: {e}")
+                return []
     
     def run_continuous(self, interval=60):
-        """Run continuous email monitoring and processing"""
+        """Run continuous email monitoring and processing, waking on IMAP IDLE pushes when supported"""
         try:
             self.connect()
-            logger.info(f"Starting continuous email monitoring (checking every {interval} seconds)...")
+            use_idle = "IDLE" in self.email_listener.imap.capabilities
+            if use_idle:
+                logger.info("Starting continuous email monitoring (IMAP IDLE push)...")
+            else:
+                logger.info(f"Starting continuous email monitoring (checking every {interval} seconds)...")
             
             while True:
                 logger.info("Checking for new emails...")
@@ -392,13 +409,26 @@ class IntegratedEmailInvoiceProcessor:
                 else:
                     logger.info("No new insurance emails found")
                 
-                logger.info(f"Waiting {interval} seconds before next check...")
-                time.sleep(interval)
+                if use_idle:
+                    # Returns on the server's EXISTS push, or after the 29 minute IDLE renewal
+                    logger.info("Waiting for new mail (IMAP IDLE)...")
+                    try:
+                        self.email_listener.wait_for_mail()
+                    except CONNECTION_ERRORS as e:
+                        logger.warning(f"IMAP connection dropped during IDLE, reconnecting: {e}")
+                        # Reconnect unconditionally; self.connect() would keep the broken session
+                        self.email_listener.connect()
+                else:
+                    logger.info(f"Waiting {interval} seconds before next check...")
+                    # Sleep in slices so long intervals still keep the connection alive
+                    deadline = time.monotonic() + interval
+                    while time.monotonic() < deadline:
+                        time.sleep(min(KEEPALIVE_INTERVAL, max(0, deadline - time.monotonic())))
+                        self.email_listener.keepalive()
                 
         except KeyboardInterrupt:
             logger.info("Stopping email processor...")
-            if self.email_listener.imap:
-                self.email_listener.imap.logout()
+            self.email_listener.disconnect()
         except Exception as e:
             logger.error(f"Error in continuous processing: {e}")
 
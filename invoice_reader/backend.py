@@ -37,6 +37,7 @@ from io import BytesIO       # Byte stream operations
 from dotenv import load_dotenv  # Environment variable loading
 from langchain_groq import ChatGroq  # Groq AI model integration
 import os           # Operating system interface
+import threading    # Guards the lazily built OCR reader
 from pdf2image import convert_from_bytes  # PDF to image conversion
 from logging_config import logger  # Logging configuration
 
@@ -58,8 +59,70 @@ if not groq_api_key:
 llm = ChatGroq(groq_api_key=groq_api_key, model_name="Llama3-8b-8192")
 logger.info("Initialized Groq model.")
 
-# Initialize EasyOCR reader for English text recognition
-reader = easyocr.Reader(['en'])  # EasyOCR for OCR fallback
+# EasyOCR reader for English text recognition, built on first use by get_reader()
+# so importing this module (e.g. in a spawned worker) doesn't load the model twice
+_reader = None
+_reader_lock = threading.Lock()
+
+def get_reader():
+    """Return the process-wide EasyOCR reader, loading the model on first use."""
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            _reader = easyocr.Reader(['en'])  # EasyOCR for OCR fallback
+            logger.info("Initialized EasyOCR reader.")
+    return _reader
+
+def init_ocr_worker():
+    """Process-pool initializer: load the OCR model before the worker takes any file."""
+    get_reader()
+
+# EasyOCR's text detector never looks at more than this many pixels on the long side
+# (its default canvas_size), so larger inputs only make preprocessing slower
+OCR_MAX_SIDE = 2560
+
+def downscale_for_ocr(image):
+    """
+    Shrink an image so its longer side is at most OCR_MAX_SIDE pixels.
+    
+    Args:
+        image (numpy.ndarray): Grayscale or color image
+        
+    Returns:
+        numpy.ndarray: The image, resized with area averaging if it was larger
+    """
+    height, width = image.shape[:2]
+    scale = OCR_MAX_SIDE / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+# Text regions recognized per forward pass; EasyOCR's default of 1 runs the
+# recognizer once per detected word box
+OCR_BATCH_SIZE = 16
+
+def render_pdf_pages(pdf_doc):
+    """
+    Rasterize every page of a PDF to a grayscale image for OCR.
+    
+    Args:
+        pdf_doc (bytes): PDF document as byte data
+        
+    Returns:
+        list: One numpy.ndarray per page, single channel and capped at OCR_MAX_SIDE
+    """
+    # Render in RGB and convert afterwards: with fmt='RGB' pdf2image parses pdftoppm's
+    # output as 3-byte PPM, so grayscale=True (1-byte PGM) would drop or corrupt pages
+    pdf_images = convert_from_bytes(
+        pdf_doc, 
+        poppler_path=POPPLER_PATH,
+        dpi=300,  # Higher DPI for better OCR accuracy
+        fmt='RGB'
+    )
+    return [
+        downscale_for_ocr(cv2.cvtColor(np.array(img), cv2.COLOR_RGB2GRAY))
+        for img in pdf_images
+    ]
 
 def get_pdf_text_with_ocr(pdf_doc):
     """
@@ -109,24 +172,13 @@ def get_pdf_text_with_ocr(pdf_doc):
     try:
         logger.info("Starting OCR fallback for scanned PDF.")
         
-        # Convert PDF to images using Poppler
-        pdf_images = convert_from_bytes(
-            pdf_doc, 
-            poppler_path=POPPLER_PATH,
-            dpi=300,  # Higher DPI for better OCR accuracy
-            fmt='RGB'
-        )
+        # Convert PDF to grayscale page images using Poppler
+        pdf_images = render_pdf_pages(pdf_doc)
         logger.info(f"Converted PDF to {len(pdf_images)} images")
         
-        for i, img in enumerate(pdf_images):
+        for i, img_gray in enumerate(pdf_images):
             logger.info(f"Running OCR on page {i+1}")
             
-            # Convert PIL image to numpy array for EasyOCR
-            img_array = np.array(img)
-            
-            # Preprocess image for better OCR results
-            img_gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            
             # Apply some image preprocessing for better OCR
             # Increase contrast
             img_enhanced = cv2.convertScaleAbs(img_gray, alpha=1.2, beta=10)
@@ -135,7 +187,7 @@ def get_pdf_text_with_ocr(pdf_doc):
             img_denoised = cv2.medianBlur(img_enhanced, 3)
             
             # Run OCR
-            ocr_result = reader.readtext(img_denoised, detail=0)  # detail=0 returns only text
+            ocr_result = get_reader().readtext(img_denoised, detail=0, batch_size=OCR_BATCH_SIZE)  # detail=0 returns only text
             page_text = "\n".join(ocr_result)
             
             if page_text.strip():
@@ -170,6 +222,9 @@ def process_image(image_file):
         
         logger.info(f"Image dimensions: {image.shape}")
         
+        # Every preprocessing step below scales with pixel count
+        image = downscale_for_ocr(image)
+        
         # Preprocess image for better OCR results
         # Convert to grayscale
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -189,15 +244,15 @@ def process_image(image_file):
         logger.info("Running OCR on processed image...")
         
         # Method 1: Direct OCR on enhanced image
-        result1 = reader.readtext(enhanced, detail=0)
+        result1 = get_reader().readtext(enhanced, detail=0, batch_size=OCR_BATCH_SIZE)
         text1 = "\n".join(result1) if result1 else ""
         
         # Method 2: OCR on thresholded image
-        result2 = reader.readtext(thresh, detail=0)
+        result2 = get_reader().readtext(thresh, detail=0, batch_size=OCR_BATCH_SIZE)
         text2 = "\n".join(result2) if result2 else ""
         
         # Method 3: OCR on original image (fallback)
-        result3 = reader.readtext(image, detail=0)
+        result3 = get_reader().readtext(image, detail=0, batch_size=OCR_BATCH_SIZE)
         text3 = "\n".join(result3) if result3 else ""
         
         # Choose the result with most text
@@ -317,36 +372,37 @@ def extracted_data(raw_text):
         logger.info("Attempting fallback regex extraction...")
         return fallback_extraction(raw_text)
 
+# Basic regex patterns for common invoice fields used by fallback_extraction.
+# Compiled once at import instead of being re-parsed for every document.
+FALLBACK_PATTERNS = {
+    'Invoice no.': [
+        re.compile(r'(?:invoice|inv)[\s#:]*([A-Z0-9-]+)', re.IGNORECASE),
+        re.compile(r'(?:number|no)[\s#:]*([A-Z0-9-]+)', re.IGNORECASE),
+        re.compile(r'#([A-Z0-9-]+)', re.IGNORECASE)
+    ],
+    'Date': [
+        re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+        re.compile(r'(\d{2,4}[/-]\d{1,2}[/-]\d{1,2})', re.IGNORECASE),
+        re.compile(r'(\w+ \d{1,2}, \d{4})', re.IGNORECASE)
+    ],
+    'Total': [
+        re.compile(r'(?:total|amount due)[\s:$]*(\d+\.?\d*)', re.IGNORECASE),
+        re.compile(r'\$(\d+\.?\d*)', re.IGNORECASE),
+        re.compile(r'(\d+\.\d{2})\s*$', re.IGNORECASE)
+    ],
+    'Email': [
+        re.compile(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', re.IGNORECASE)
+    ],
+    'Phone number': [
+        re.compile(r'(\d{3}[-.\s]?\d{3}[-.\s]?\d{4})', re.IGNORECASE),
+        re.compile(r'\((\d{3})\)\s*(\d{3}[-.\s]?\d{4})', re.IGNORECASE)
+    ]
+}
+
 def fallback_extraction(raw_text):
     """Fallback extraction using regex patterns when Groq API fails"""
     logger.info("Using fallback regex-based extraction")
     
-    # Basic regex patterns for common invoice fields
-    patterns = {
-        'Invoice no.': [
-            r'(?:invoice|inv)[\s#:]*([A-Z0-9-]+)',
-            r'(?:number|no)[\s#:]*([A-Z0-9-]+)',
-            r'#([A-Z0-9-]+)'
-        ],
-        'Date': [
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'(\d{2,4}[/-]\d{1,2}[/-]\d{1,2})',
-            r'(\w+ \d{1,2}, \d{4})'
-        ],
-        'Total': [
-            r'(?:total|amount due)[\s:$]*(\d+\.?\d*)',
-            r'\$(\d+\.?\d*)',
-            r'(\d+\.\d{2})\s*$'
-        ],
-        'Email': [
-            r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-        ],
-        'Phone number': [
-            r'(\d{3}[-.\s]?\d{3}[-.\s]?\d{4})',
-            r'\((\d{3})\)\s*(\d{3}[-.\s]?\d{4})'
-        ]
-    }
-    
     extracted = {
         'Invoice no.': 'N/A',
         'Description': 'N/A',
@@ -364,9 +420,9 @@ def fallback_extraction(raw_text):
     text_lower = raw_text.lower()
     
     # Extract fields using regex
-    for field, pattern_list in patterns.items():
+    for field, pattern_list in FALLBACK_PATTERNS.items():
         for pattern in pattern_list:
-            match = re.search(pattern, text_lower, re.IGNORECASE)
+            match = pattern.search(text_lower)
             if match:
                 extracted[field] = match.group(1) if match.lastindex else match.group(0)
                 break
@@ -380,100 +436,140 @@ def fallback_extraction(raw_text):
     logger.info(f"Fallback extraction completed: {extracted}")
     return json.dumps(extracted)
 
-def create_docs(user_file_list):
-    """Process the list of uploaded files (PDFs or images) and extract structured data."""
-    df = pd.DataFrame(columns=['Invoice no.', 'Description', 'Quantity', 'Date', 
-                               'Unit price', 'Amount', 'Total', 'Email', 'Phone number', 'Address'])
+# Columns of the DataFrame returned by create_docs, in output order
+INVOICE_COLUMNS = ['Invoice no.', 'Description', 'Quantity', 'Date',
+                   'Unit price', 'Amount', 'Total', 'Email', 'Phone number', 'Address']
 
-    if not user_file_list:
-        logger.warning("No files provided for processing")
-        return df
+# MIME type by file extension for files read from disk
+MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png'
+}
 
-    logger.info(f"Processing {len(user_file_list)} files")
+class LocalFile:
+    """File on disk exposing the name/type/read() interface of a Streamlit upload."""
+    __slots__ = ("name", "type", "file_path", "data")
 
-    for uploaded_file in user_file_list:
-        logger.info(f"Processing file: {uploaded_file.name}")
-        file_type = uploaded_file.type
-        logger.info(f"File type: {file_type}")
-
-        raw_data = None
-
-        if file_type == "application/pdf":
-            logger.info("Processing as PDF file")
-            file_content = uploaded_file.read()
-            logger.info(f"PDF file size: {len(file_content)} bytes")
-            raw_data = get_pdf_text_with_ocr(file_content)
-        elif file_type in ["image/jpeg", "image/png", "image/jpg"]:
-            logger.info("Processing as image file")
-            raw_data = process_image(uploaded_file)
-        else:
-            logger.warning(f"Unsupported file type: {uploaded_file.name} ({file_type})")
-            continue
+    def __init__(self, file_path):
+        self.name = os.path.basename(file_path)
+        self.file_path = file_path
+        self.type = MIME_TYPES.get(os.path.splitext(file_path)[1].lower(), 'application/octet-stream')
+        self.data = None
 
-        if raw_data and raw_data.strip():
-            logger.info(f"Extracted {len(raw_data)} characters of text from {uploaded_file.name}")
-            logger.debug(f"Raw text preview: {raw_data[:300]}...")
-            
-            llm_extracted_data = extracted_data(raw_data)
-            if llm_extracted_data:
-                try:
-                    logger.info("Parsing extracted JSON data")
-                    # Clean the JSON string
-                    cleaned_data = llm_extracted_data.replace("'", '"')
-                    data_dict = json.loads(cleaned_data)
-                    logger.info(f"Successfully parsed data: {list(data_dict.keys())}")
-                    logger.debug(f"Parsed Data Dict: {data_dict}")
-
-                    # Handle multiple line items if present
-                    if isinstance(data_dict.get('Description'), str) and '\n' in data_dict['Description']:
-                        logger.info("Processing multiple line items")
-                        descriptions = data_dict['Description'].split('\n')
-                        quantities = data_dict.get('Quantity', 'N/A').split('\n') if isinstance(data_dict.get('Quantity'), str) else ['N/A'] * len(descriptions)
-                        unit_prices = data_dict.get('Unit price', 'N/A').split('\n') if isinstance(data_dict.get('Unit price'), str) else ['N/A'] * len(descriptions)
-                        amounts = data_dict.get('Amount', 'N/A').split('\n') if isinstance(data_dict.get('Amount'), str) else ['N/A'] * len(descriptions)
-
-                        for desc, qty, unit_price, amt in zip(descriptions, quantities, unit_prices, amounts):
-                            row = {
-                                'Invoice no.': data_dict.get('Invoice no.', 'N/A'),
-                                'Description': desc.strip(),
-                                'Quantity': qty.strip(),
-                                'Date': data_dict.get('Date', 'N/A'),
-                                'Unit price': unit_price.strip(),
-                                'Amount': amt.strip(),
-                                'Total': data_dict.get('Total', 'N/A'),
-                                'Email': data_dict.get('Email', 'N/A'),
-                                'Phone number': data_dict.get('Phone number', 'N/A'),
-                                'Address': data_dict.get('Address', 'N/A')
-                            }
-                            df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-                            logger.debug(f"Added row: {row}")
-                    else:
-                        logger.info("Processing single line item")
-                        # Ensure all required keys exist
+    def read(self):
+        """Read the file contents as bytes, hitting the disk only on the first call."""
+        if self.data is None:
+            with open(self.file_path, 'rb') as f:
+                self.data = f.read()
+        return self.data
+
+def extract_rows(uploaded_file):
+    """Extract the invoice rows of a single PDF or image file as a list of dicts."""
+    rows = []
+    logger.info(f"Processing file: {uploaded_file.name}")
+    file_type = uploaded_file.type
+    logger.info(f"File type: {file_type}")
+
+    raw_data = None
+
+    if file_type == "application/pdf":
+        logger.info("Processing as PDF file")
+        file_content = uploaded_file.read()
+        logger.info(f"PDF file size: {len(file_content)} bytes")
+        raw_data = get_pdf_text_with_ocr(file_content)
+    elif file_type in ["image/jpeg", "image/png", "image/jpg"]:
+        logger.info("Processing as image file")
+        raw_data = process_image(uploaded_file)
+    else:
+        logger.warning(f"Unsupported file type: {uploaded_file.name} ({file_type})")
+        return rows
+
+    if raw_data and raw_data.strip():
+        logger.info(f"Extracted {len(raw_data)} characters of text from {uploaded_file.name}")
+        logger.debug(f"Raw text preview: {raw_data[:300]}...")
+        
+        llm_extracted_data = extracted_data(raw_data)
+        if llm_extracted_data:
+            try:
+                logger.info("Parsing extracted JSON data")
+                # Clean the JSON string
+                cleaned_data = llm_extracted_data.replace("'", '"')
+                data_dict = json.loads(cleaned_data)
+                logger.info(f"Successfully parsed data: {list(data_dict.keys())}")
+                logger.debug(f"Parsed Data Dict: {data_dict}")
+
+                # Handle multiple line items if present
+                if isinstance(data_dict.get('Description'), str) and '\n' in data_dict['Description']:
+                    logger.info("Processing multiple line items")
+                    descriptions = data_dict['Description'].split('\n')
+                    quantities = data_dict.get('Quantity', 'N/A').split('\n') if isinstance(data_dict.get('Quantity'), str) else ['N/A'] * len(descriptions)
+                    unit_prices = data_dict.get('Unit price', 'N/A').split('\n') if isinstance(data_dict.get('Unit price'), str) else ['N/A'] * len(descriptions)
+                    amounts = data_dict.get('Amount', 'N/A').split('\n') if isinstance(data_dict.get('Amount'), str) else ['N/A'] * len(descriptions)
+
+                    for desc, qty, unit_price, amt in zip(descriptions, quantities, unit_prices, amounts):
                         row = {
                             'Invoice no.': data_dict.get('Invoice no.', 'N/A'),
-                            'Description': data_dict.get('Description', 'N/A'),
-                            'Quantity': data_dict.get('Quantity', 'N/A'),
+                            'Description': desc.strip(),
+                            'Quantity': qty.strip(),
                             'Date': data_dict.get('Date', 'N/A'),
-                            'Unit price': data_dict.get('Unit price', 'N/A'),
-                            'Amount': data_dict.get('Amount', 'N/A'),
+                            'Unit price': unit_price.strip(),
+                            'Amount': amt.strip(),
                             'Total': data_dict.get('Total', 'N/A'),
                             'Email': data_dict.get('Email', 'N/A'),
                             'Phone number': data_dict.get('Phone number', 'N/A'),
                             'Address': data_dict.get('Address', 'N/A')
                         }
-                        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+                        rows.append(row)
                         logger.debug(f"Added row: {row}")
-                        
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error parsing JSON from {uploaded_file.name}: {e}")
-                    logger.debug(f"Problematic JSON: {llm_extracted_data}")
-                except Exception as e:
-                    logger.error(f"Unexpected error during parsing {uploaded_file.name}: {e}", exc_info=True)
-            else:
-                logger.warning(f"No data extracted from LLM for file: {uploaded_file.name}")
+                else:
+                    logger.info("Processing single line item")
+                    # Ensure all required keys exist
+                    row = {
+                        'Invoice no.': data_dict.get('Invoice no.', 'N/A'),
+                        'Description': data_dict.get('Description', 'N/A'),
+                        'Quantity': data_dict.get('Quantity', 'N/A'),
+                        'Date': data_dict.get('Date', 'N/A'),
+                        'Unit price': data_dict.get('Unit price', 'N/A'),
+                        'Amount': data_dict.get('Amount', 'N/A'),
+                        'Total': data_dict.get('Total', 'N/A'),
+                        'Email': data_dict.get('Email', 'N/A'),
+                        'Phone number': data_dict.get('Phone number', 'N/A'),
+                        'Address': data_dict.get('Address', 'N/A')
+                    }
+                    rows.append(row)
+                    logger.debug(f"Added row: {row}")
+                    
+            except json.JSONDecodeError as e:
+                logger.error(f"Error parsing JSON from {uploaded_file.name}: {e}")
+                logger.debug(f"Problematic JSON: {llm_extracted_data}")
+            except Exception as e:
+                logger.error(f"Unexpected error during parsing {uploaded_file.name}: {e}", exc_info=True)
         else:
-            logger.warning(f"No text extracted from file: {uploaded_file.name}")
-    
+            logger.warning(f"No data extracted from LLM for file: {uploaded_file.name}")
+    else:
+        logger.warning(f"No text extracted from file: {uploaded_file.name}")
+
+    return rows
+
+def extract_file_rows(file_path):
+    """Extract the invoice rows of a file on disk; top-level so process pools can pickle it."""
+    return extract_rows(LocalFile(file_path))
+
+def create_docs(user_file_list):
+    """Process the list of uploaded files (PDFs or images) and extract structured data."""
+    if not user_file_list:
+        logger.warning("No files provided for processing")
+        return pd.DataFrame(columns=INVOICE_COLUMNS)
+
+    logger.info(f"Processing {len(user_file_list)} files")
+
+    # Build the frame once at the end instead of concatenating a copy per row
+    rows = []
+    for uploaded_file in user_file_list:
+        rows.extend(extract_rows(uploaded_file))
+    df = pd.DataFrame(rows, columns=INVOICE_COLUMNS)
+
     logger.info(f"Data extraction process completed. Processed {len(df)} records.")
     return df